@@ -0,0 +1,229 @@
+import hashlib
+import hmac
+import secrets
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from rolepermissions.roles import RoleDoesNotExist, retrieve_role
+
+from .models import ActivationToken, User, ValidStaff, ValidStudent, normalize_department
+
+'''
+Bulk account activation for whole cohorts.
+
+Instead of every student or staff member calling the activate endpoint (one PBKDF2
+hash, several saves and an assign_role each), an admin activates a filtered set of
+ValidStudent / ValidStaff records in one job: users are created with bulk_create and
+an unusable password, roles are written as bulk group / permission rows, and every
+account receives a one-time activation token. Tokens are random 256-bit values, so a
+sha256 digest is stored rather than a slow password hash. The holder redeems the token
+once to choose a password.
+'''
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def _split_name(full_name):
+    first_name, *last_name = full_name.split()
+    return first_name, ' '.join(last_name)
+
+
+def _student_user(student):
+    first_name, last_name = _split_name(student.name)
+    return User(
+        username=student.enrollment_number,
+        email=student.university_email,
+        first_name=first_name,
+        last_name=last_name,
+        department=student.department,
+        phone=student.phone,
+        avatar=student.avatar,
+        avatar_variants=student.avatar_variants,
+        bio=student.bio,
+        year=student.year,
+        semester=student.semester,
+        admission_date=student.admission_date,
+        expected_graduation=student.expected_graduation,
+        gpa=student.gpa,
+        credits=student.credits,
+        role='student',
+    )
+
+
+def _staff_user(staff):
+    first_name, last_name = _split_name(staff.name)
+    return User(
+        username=staff.staff_id,
+        email=staff.university_email,
+        first_name=first_name,
+        last_name=last_name,
+        department=staff.department,
+        phone=staff.phone,
+        avatar=staff.avatar,
+        avatar_variants=staff.avatar_variants,
+        bio=staff.bio,
+        position=staff.position,
+        clearance_type_id=staff.clearance_type_id,
+        role=staff.role,
+    )
+
+
+@dataclass(frozen=True)
+class Cohort:
+    model: type
+    key: str
+    build_user: object
+
+
+COHORTS = {
+    'students': Cohort(model=ValidStudent, key='enrollment_number', build_user=_student_user),
+    'staff': Cohort(model=ValidStaff, key='staff_id', build_user=_staff_user),
+}
+
+
+@dataclass
+class ActivationResult:
+    # (username, email, raw token) for every account created, to be handed out to its owner
+    issued: list = field(default_factory=list)
+
+    @property
+    def activated(self):
+        return len(self.issued)
+
+    def as_dict(self):
+        return {
+            'activated': self.activated,
+            'accounts': [
+                {'id_number': username, 'email': email, 'token': token}
+                for username, email, token in self.issued
+            ],
+        }
+
+
+def pending_records(kind, queryset=None):
+    """ Active records of `queryset` (default: all) that don't have an account yet. """
+    cohort = COHORTS[kind]
+    if queryset is None:
+        queryset = cohort.model.objects.all()
+    return (
+        queryset.filter(status='active')
+        .filter(~Exists(User.objects.filter(username=OuterRef(cohort.key))))
+        .order_by(cohort.key)
+    )
+
+
+def hash_token(token):
+    # A random token can't be guessed from its digest, a salted slow hash adds nothing
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_matches(token, token_hash):
+    if '$' in token_hash:
+        # PBKDF2 hash of a token issued before digests were used
+        return check_password(token, token_hash)
+    return hmac.compare_digest(hash_token(token), token_hash)
+
+
+def assign_roles(users):
+    """
+    What rolepermissions.assign_role does per user, as two bulk inserts: membership of
+    the role's group and the role's default permissions.
+    """
+    groups, permissions = {}, {}
+    for role in {user.role for user in users}:
+        role_cls = retrieve_role(role)
+        if not role_cls:
+            raise RoleDoesNotExist
+        groups[role], _ = Group.objects.get_or_create(name=role_cls.get_name())
+        permissions[role] = role_cls.get_default_true_permissions()
+
+    UserGroup = User.groups.through
+    UserPermission = User.user_permissions.through
+    UserGroup.objects.bulk_create(
+        [UserGroup(user_id=user.pk, group_id=groups[user.role].pk) for user in users],
+        ignore_conflicts=True,
+    )
+    UserPermission.objects.bulk_create(
+        [
+            UserPermission(user_id=user.pk, permission_id=permission.pk)
+            for user in users for permission in permissions[user.role]
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def activate_batch(cohort, records, expires_at=None):
+    users = [cohort.build_user(record) for record in records]
+    for user in users:
+        # bulk_create bypasses User.save()
+        user.department_key = normalize_department(user.department)
+        user.set_unusable_password()
+
+    tokens = [secrets.token_urlsafe(32) for _ in users]
+    token_hashes = [hash_token(token) for token in tokens]
+    expires_at = expires_at or timezone.now() + settings.ACTIVATION_TOKEN_LIFETIME
+
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        if users and users[0].pk is None:
+            # MySQL doesn't return the ids of bulk inserted rows
+            ids = dict(User.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id'))
+            for user in users:
+                user.pk = ids[user.username]
+
+        assign_roles(users)
+        ActivationToken.objects.bulk_create([
+            ActivationToken(user_id=user.pk, token_hash=token_hash, expires_at=expires_at)
+            for user, token_hash in zip(users, token_hashes)
+        ])
+
+    return [(user.username, user.email, token) for user, token in zip(users, tokens)]
+
+
+def activate_cohort(kind, queryset=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Create accounts for the not yet activated, active records of `queryset`.
+    Each batch commits on its own, so a failure keeps the batches already done.
+    """
+    cohort = COHORTS[kind]
+    records = pending_records(kind, queryset)
+    result = ActivationResult()
+
+    last_key = None
+    while True:
+        # Keyset over the anti-join, created accounts drop out of it anyway
+        page = records if last_key is None else records.filter(**{f'{cohort.key}__gt': last_key})
+        batch = list(page[:batch_size])
+        if not batch:
+            break
+        result.issued.extend(activate_batch(cohort, batch))
+        last_key = getattr(batch[-1], cohort.key)
+    return result
+
+
+def redeem_token(id_number, token, password):
+    """
+    Set the password of a bulk activated account. Returns the user, or None if the
+    token is unknown, used, expired or wrong.
+    """
+    try:
+        activation = ActivationToken.objects.select_related('user').get(user__username=id_number)
+    except ActivationToken.DoesNotExist:
+        return None
+    if not activation.is_usable() or not token_matches(token, activation.token_hash):
+        return None
+
+    with transaction.atomic():
+        # Only one concurrent redemption wins
+        claimed = ActivationToken.objects.filter(pk=activation.pk, used_at__isnull=True).update(used_at=timezone.now())
+        if not claimed:
+            return None
+        user = activation.user
+        user.set_password(password)
+        user.save(update_fields=['password'])
+    return user
@@ -1,6 +1,46 @@
+import csv
+
 from django.contrib import admin
+from django.http import HttpResponse
 
+from accounts import activation
 from accounts.models import *
 
 # Register your models here.
-admin.site.register(User)
\ No newline at end of file
+admin.site.register(User)
+
+@admin.register(ClearanceType)
+class ClearanceTypeAdmin(admin.ModelAdmin):
+    list_display = ('clearance_type', 'department_scoped', 'priority', 'staff_role')
+
+
+class BulkActivationAdmin(admin.ModelAdmin):
+    cohort = None
+    actions = ['activate_accounts']
+
+    @admin.action(description='Activate accounts (download one-time tokens)')
+    def activate_accounts(self, request, queryset):
+        result = activation.activate_cohort(self.cohort, queryset)
+        # The raw tokens exist only in this response
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{self.cohort}-activation-tokens.csv"'
+        writer = csv.writer(response)
+        writer.writerow(['id_number', 'email', 'token'])
+        writer.writerows(result.issued)
+        return response
+
+
+@admin.register(ValidStudent)
+class ValidStudentAdmin(BulkActivationAdmin):
+    cohort = 'students'
+    list_display = ('enrollment_number', 'name', 'department', 'course', 'status')
+    list_filter = ('status', 'department', 'course')
+    search_fields = ('enrollment_number', 'name', 'university_email')
+
+
+@admin.register(ValidStaff)
+class ValidStaffAdmin(BulkActivationAdmin):
+    cohort = 'staff'
+    list_display = ('staff_id', 'name', 'department', 'role', 'clearance_type', 'status')
+    list_filter = ('status', 'role', 'department')
+    search_fields = ('staff_id', 'name', 'university_email')
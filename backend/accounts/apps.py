@@ -5,4 +5,5 @@ class AccountsConfig(AppConfig):
     name = 'accounts'
 
     def ready(self):
-        import accounts.jwt_overrides  # triggers max_length change before migration
\ No newline at end of file
+        import accounts.jwt_overrides  # triggers max_length change before migration
+        import accounts.signals  # clears the clearance type registry on changes, resizes new avatars
\ No newline at end of file
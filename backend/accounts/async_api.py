@@ -0,0 +1,83 @@
+import asyncio
+import functools
+import logging
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .authentication import ClaimsJWTAuthentication
+
+'''
+Helpers for the async read views (clearance.async_views, accounts.async_views).
+
+Django's async ORM methods (aget, acount, ...) all run on asgiref's one shared
+sync thread, so under load every async view would queue behind it. These views
+run their queries with in_thread() instead: each call gets a worker thread and a
+connection of its own, and independent calls go into asyncio.gather() to
+overlap. Responses are plain JsonResponses shaped like the DRF views they mirror.
+'''
+
+logger = logging.getLogger(__name__)
+
+
+def _close_connections_after(func):
+    @functools.wraps(func)
+    def inner(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Worker threads outlive the request, respect CONN_MAX_AGE like request_finished does
+            close_old_connections()
+    return inner
+
+
+async def in_thread(func, *args, **kwargs):
+    """ Run blocking ORM or storage work in a worker thread, concurrently with other in_thread() calls. """
+    return await sync_to_async(_close_connections_after(func), thread_sensitive=False)(*args, **kwargs)
+
+
+def error(message, status_code):
+    return JsonResponse({'error': message}, status=status_code)
+
+
+def _authenticate(request):
+    try:
+        result = ClaimsJWTAuthentication().authenticate(request)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return result[0] if result else None
+
+
+def async_api_view(view):
+    """
+    Turn `async def view(request, ...)` into a GET-only endpoint for authenticated
+    users. `request` is a DRF Request, so serializers and helpers that read
+    request.user or request.query_params work as in the APIView versions. The
+    view returns (data, status); unexpected errors become 500 responses.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return error(f'Method "{request.method}" not allowed.', status.HTTP_405_METHOD_NOT_ALLOWED)
+
+        user = await in_thread(_authenticate, request)
+        if user is None:
+            return error('Authentication credentials were not provided or are invalid.', status.HTTP_401_UNAUTHORIZED)
+
+        api_request = Request(request)
+        api_request.user = user
+        try:
+            data, status_code = await view(api_request, *args, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception('%s failed', view.__name__)
+            return error(f'Unexpected error: {str(e)}', status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse(data, status=status_code, safe=False, encoder=DjangoJSONEncoder)
+
+    return wrapper
@@ -0,0 +1,16 @@
+from rest_framework import status
+
+from .async_api import async_api_view, in_thread
+from .authentication import resolve_user
+from .serializers import UserSerializer
+
+''' Async counterparts of the read-only account views, routed by accounts.urls when ASYNC_READ_VIEWS is set '''
+
+
+def _profile(request):
+    return UserSerializer(resolve_user(request.user), context={'request': request}).data
+
+
+@async_api_view
+async def me(request):
+    return await in_thread(_profile, request), status.HTTP_200_OK
@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import USER_CLAIMS
+
+'''
+Stateless JWT authentication.
+
+Access tokens issued by accounts.tokens carry role, department and clearance type,
+so requests are authenticated into a ClaimsUser built from the token alone. The
+User row is only loaded when a view reads a field that isn't a claim, or asks for
+the model instance through resolve_user().
+
+Deactivation is enforced through a short-lived per-user state cache: the active
+flag is read from the database at most once per JWT_USER_STATE_CACHE_TTL seconds,
+and DeactivateUserView updates the cached flag right away.
+'''
+
+USER_STATE_CACHE_KEY = 'accounts:user_active:{}'
+
+
+def _state_ttl():
+    return getattr(settings, 'JWT_USER_STATE_CACHE_TTL', 60)
+
+
+def is_user_active(user_id):
+    key = USER_STATE_CACHE_KEY.format(user_id)
+    active = cache.get(key)
+    if active is None:
+        active = get_user_model().objects.filter(pk=user_id, is_active=True).exists()
+        cache.set(key, active, _state_ttl())
+    return active
+
+
+def set_user_active(user_id, active):
+    # Called on (de)activation so this process doesn't wait for the cached flag to expire
+    cache.set(USER_STATE_CACHE_KEY.format(user_id), active, _state_ttl())
+
+
+class ClaimsUser(TokenUser):
+    """
+    Token-backed user exposing the claims as attributes. Any other attribute is read
+    from the full User row, which is loaded on first use.
+    """
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def role(self):
+        return self.token['role']
+
+    @cached_property
+    def department(self):
+        return self.token['department']
+
+    @cached_property
+    def department_key(self):
+        return self.token['department_key']
+
+    @cached_property
+    def clearance_type_id(self):
+        return self.token['clearance_type_id']
+
+    def __str__(self):
+        return f"{self.username} ({self.role})"
+
+    @cached_property
+    def instance(self):
+        return get_user_model().objects.get(pk=self.id)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.instance, attr)
+
+
+def resolve_user(user):
+    """ The User model instance behind request.user. """
+    return user.instance if isinstance(user, ClaimsUser) else user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            # Issued before the claims existed, authenticate against the User row
+            return super().get_user(validated_token)
+
+        user = ClaimsUser(validated_token)
+        if not is_user_active(user.id):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
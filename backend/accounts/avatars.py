@@ -0,0 +1,94 @@
+import hashlib
+import io
+import logging
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.views.static import serve
+from PIL import Image, ImageOps, features
+
+from project import tasks
+
+'''
+Fixed-size avatar variants for User, ValidStudent and ValidStaff.
+
+When an avatar changes, a background task crops it to a square and stores one file
+per AVATAR_SIZES entry under avatars/variants/<sha256 of the original>/<size>.webp
+(JPEG where Pillow has no WebP support). The names in the model's `avatar_variants`
+column are never overwritten, so they are served with long-lived cache headers.
+`avatar_variants['source']` records the original they were made from; until it
+matches the current avatar, serializers fall back to the original file.
+'''
+
+logger = logging.getLogger(__name__)
+
+# Square edge length in pixels
+AVATAR_SIZES = {'small': 64, 'medium': 160, 'large': 480}
+VARIANT_PREFIX = 'avatars/variants/'
+AVATAR_MODELS = ('accounts.User', 'accounts.ValidStudent', 'accounts.ValidStaff')
+
+
+def _variant_format():
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def schedule(instance):
+    """ Build the variants of instance.avatar in the background once the current transaction commits. """
+    tasks.run(generate, instance._meta.label, instance.pk, instance.avatar.name)
+
+
+def _variant_bytes(image, edge, image_format):
+    variant = ImageOps.fit(image, (edge, edge), Image.LANCZOS)
+    buffer = io.BytesIO()
+    variant.save(buffer, format=image_format, quality=82)
+    return buffer.getvalue()
+
+
+def generate(model_label, pk, source_name):
+    model = apps.get_model(model_label)
+    with default_storage.open(source_name, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    image = Image.open(io.BytesIO(data))
+    # Phone photos carry their rotation in EXIF, apply it before dropping the metadata
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    image_format, extension = _variant_format()
+
+    variants = {'source': source_name}
+    for size, edge in AVATAR_SIZES.items():
+        name = f'{VARIANT_PREFIX}{digest[:2]}/{digest}/{size}.{extension}'
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(_variant_bytes(image, edge, image_format)))
+        variants[size] = name
+
+    # update() rather than save(): no signals, and nothing is written if the avatar changed meanwhile
+    model.objects.filter(pk=pk, avatar=source_name).update(avatar_variants=variants)
+
+
+def avatar_url(request, name, variants, size=None):
+    """
+    URL of the `size` variant of the avatar stored as `name`, or of the original when
+    no size is asked for, the size is unknown or the variants aren't built yet.
+    """
+    if not name:
+        return None
+    if size in AVATAR_SIZES and variants and variants.get('source') == name:
+        name = variants[size]
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def requested_size(request, default=None):
+    """ The ?size= query parameter: small, medium, large or original. """
+    size = request.query_params.get('size', default) if request else default
+    return size if size in AVATAR_SIZES else None
+
+
+def serve_variant(request, path):
+    """ Serve a variant from MEDIA_ROOT; their names never change, so clients may cache them for good. """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    response['Cache-Control'] = f'public, max-age={getattr(settings, "AVATAR_CACHE_MAX_AGE", 31536000)}, immutable'
+    return response
@@ -0,0 +1,120 @@
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+'''
+Pluggable store for revoked refresh tokens, selected with the TOKEN_BLACKLIST setting.
+
+DatabaseBlacklist keeps simplejwt's OutstandingToken / BlacklistedToken tables
+(prune them with the prune_token_blacklist command). CacheBlacklist and
+RedisBlacklist only record revoked tokens, each entry expiring together with the
+token, so nothing needs pruning.
+'''
+
+DEFAULT_KEY_PREFIX = 'jwt:blacklist:'
+
+
+def _jti(token):
+    return token.payload[api_settings.JTI_CLAIM]
+
+
+def _ttl(token):
+    # Seconds until the token expires on its own, after that it can't be used anyway
+    return max(1, int(token.payload['exp'] - time.time()))
+
+
+class DatabaseBlacklist:
+    """ simplejwt's token_blacklist tables, one row per issued refresh token. """
+
+    def __init__(self, **options):
+        pass
+
+    def outstand(self, token, user=None):
+        if user is None:
+            user = get_user_model().objects.filter(
+                **{api_settings.USER_ID_FIELD: token.payload.get(api_settings.USER_ID_CLAIM)}
+            ).first()
+        outstanding, _ = OutstandingToken.objects.get_or_create(
+            jti=_jti(token),
+            defaults={
+                'user': user,
+                'created_at': token.current_time,
+                'token': str(token),
+                'expires_at': datetime_from_epoch(token.payload['exp']),
+            },
+        )
+        return outstanding
+
+    def blacklist(self, token):
+        BlacklistedToken.objects.get_or_create(token=self.outstand(token))
+
+    def is_blacklisted(self, jti):
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+class CacheBlacklist:
+    """ A Django cache alias, e.g. LocMem for tests or a shared cache in production. """
+
+    def __init__(self, alias='default', key_prefix=DEFAULT_KEY_PREFIX):
+        self.cache = caches[alias]
+        self.key_prefix = key_prefix
+
+    def outstand(self, token, user=None):
+        # Only revoked tokens are recorded
+        pass
+
+    def blacklist(self, token):
+        self.cache.set(self.key_prefix + _jti(token), 1, timeout=_ttl(token))
+
+    def is_blacklisted(self, jti):
+        return self.cache.get(self.key_prefix + jti) is not None
+
+
+class RedisBlacklist:
+    """
+    Any server speaking the Redis protocol. `client` is the dotted path of a callable
+    returning a client (e.g. fakeredis.FakeRedis), otherwise one is made from `url`.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', client=None, key_prefix=DEFAULT_KEY_PREFIX):
+        if client:
+            self.client = import_string(client)()
+        else:
+            try:
+                import redis
+            except ImportError:
+                raise ImproperlyConfigured('RedisBlacklist requires the redis package.')
+            self.client = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+
+    def outstand(self, token, user=None):
+        pass
+
+    def blacklist(self, token):
+        self.client.set(self.key_prefix + _jti(token), 1, ex=_ttl(token))
+
+    def is_blacklisted(self, jti):
+        return bool(self.client.exists(self.key_prefix + jti))
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    config = getattr(settings, 'TOKEN_BLACKLIST', {})
+    backend = import_string(config.get('BACKEND', 'accounts.blacklist.DatabaseBlacklist'))
+    return backend(**config.get('OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    if setting == 'TOKEN_BLACKLIST':
+        get_store.cache_clear()
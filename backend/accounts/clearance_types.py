@@ -0,0 +1,115 @@
+import hashlib
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ClearanceType
+
+'''
+Process-local registry of clearance types.
+
+The table only holds a handful of rows and almost never changes, so it is loaded
+once per worker and served from memory. Saves and deletes clear it through the
+signals in accounts.signals. With CLEARANCE_TYPE_REGISTRY_SHARED enabled, a
+version number in the Django cache tells other worker processes to reload too.
+
+The returned ClearanceType instances are shared between requests, treat them as read-only.
+'''
+
+VERSION_CACHE_KEY = 'accounts:clearance_types:version'
+
+# Swapped as a whole so readers never see a partial load. `fingerprint` changes with
+# any loaded field, for caches keyed on what the types look like (clearance.dashboards)
+Snapshot = namedtuple('Snapshot', ['version', 'by_id', 'by_name', 'fingerprint'])
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+def _shared():
+    return getattr(settings, 'CLEARANCE_TYPE_REGISTRY_SHARED', False)
+
+
+def _shared_version():
+    return cache.get(VERSION_CACHE_KEY, 0) if _shared() else None
+
+
+def _fingerprint(types):
+    fields = [(ct.id, ct.clearance_type, ct.department_scoped, ct.priority, ct.staff_role) for ct in types]
+    return hashlib.md5(repr(fields).encode()).hexdigest()
+
+
+def snapshot():
+    """
+    Return the current Snapshot, loading it if needed. A new object is built on every
+    reload, so callers can cache data derived from it keyed on identity.
+    """
+    global _snapshot
+    version = _shared_version()
+    current = _snapshot
+    if current is not None and current.version == version:
+        return current
+
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            types = list(ClearanceType.objects.order_by('id'))
+            _snapshot = Snapshot(
+                version=version,
+                by_id={ct.id: ct for ct in types},
+                by_name={ct.clearance_type.lower(): ct for ct in types},
+                fingerprint=_fingerprint(types),
+            )
+        return _snapshot
+
+
+def get_by_id(clearance_type_id):
+    try:
+        return snapshot().by_id[int(clearance_type_id)]
+    except (KeyError, TypeError, ValueError):
+        raise ClearanceType.DoesNotExist(f"No clearance type with id {clearance_type_id!r}.")
+
+
+def get_by_name(name):
+    try:
+        return snapshot().by_name[name.lower()]
+    except (KeyError, AttributeError):
+        raise ClearanceType.DoesNotExist(f"No clearance type named {name!r}.")
+
+
+def all_types():
+    return list(snapshot().by_id.values())
+
+
+def count():
+    return len(snapshot().by_id)
+
+
+def _bump_shared_version():
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        # Key missing or evicted, any new value differs from what workers hold
+        cache.add(VERSION_CACHE_KEY, 1, timeout=None)
+
+
+def _clear():
+    global _snapshot
+    with _lock:
+        _snapshot = None
+
+
+def _committed():
+    _clear()
+    if _shared():
+        # Other processes reload once the change is visible to them
+        _bump_shared_version()
+
+
+def invalidate():
+    # Cleared now so the writing transaction sees its change, and again after the commit:
+    # another thread reloading in between still reads the old rows and would keep them
+    _clear()
+    transaction.on_commit(_committed)
@@ -0,0 +1,35 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import activation
+from accounts.models import normalize_department
+
+
+class Command(BaseCommand):
+    help = 'Create accounts with one-time activation tokens for not yet activated ValidStudent or ValidStaff records.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(activation.COHORTS))
+        parser.add_argument('output', help='CSV file the id numbers, emails and raw tokens are written to.')
+        parser.add_argument('--department', help='Only records of this department.')
+        parser.add_argument('--batch-size', type=int, default=activation.DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        cohort = activation.COHORTS[options['kind']]
+        records = cohort.model.objects.all()
+        if options['department']:
+            records = records.filter(department_key=normalize_department(options['department']))
+
+        try:
+            out = open(options['output'], 'w', newline='')
+        except OSError as e:
+            raise CommandError(f"Could not write {options['output']}: {e}")
+
+        with out:
+            result = activation.activate_cohort(options['kind'], records, batch_size=options['batch_size'])
+            writer = csv.writer(out)
+            writer.writerow(['id_number', 'email', 'token'])
+            writer.writerows(result.issued)
+
+        self.stdout.write(self.style.SUCCESS(f'Activated {result.activated} accounts.'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import ClearanceType
+
+# Rules the views hard-coded before they moved onto ClearanceType: (department_scoped, priority)
+LEGACY_ROUTING = {
+    'project': (True, 'high'),
+    'lab': (True, 'medium'),
+    'library': (False, 'medium'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Set department_scoped and priority on the existing project, lab and library clearance types. '
+        'Run once after the migration that adds the routing columns, their defaults route every type university wide.'
+    )
+
+    def handle(self, *args, **options):
+        updated = 0
+        for clearance_type in ClearanceType.objects.order_by('id'):
+            rule = LEGACY_ROUTING.get(clearance_type.clearance_type.strip().lower())
+            if rule is None or (clearance_type.department_scoped, clearance_type.priority) == rule:
+                continue
+            clearance_type.department_scoped, clearance_type.priority = rule
+            # save() rather than update(), the signals reload the clearance type registry
+            clearance_type.save(update_fields=['department_scoped', 'priority'])
+            updated += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{updated} clearance types updated.'))
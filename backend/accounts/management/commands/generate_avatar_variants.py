@@ -0,0 +1,24 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from accounts import avatars
+
+
+class Command(BaseCommand):
+    help = 'Build resized avatar variants for users and roster records whose variants are missing or stale.'
+
+    def handle(self, *args, **options):
+        generated = failed = 0
+        for label in avatars.AVATAR_MODELS:
+            model = apps.get_model(label)
+            rows = model.objects.exclude(avatar='').exclude(avatar=None).values_list('pk', 'avatar', 'avatar_variants')
+            for pk, name, variants in rows.iterator():
+                if (variants or {}).get('source') == name:
+                    continue
+                try:
+                    avatars.generate(label, pk, name)
+                    generated += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{label} {pk}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {generated} avatars, {failed} failed.'))
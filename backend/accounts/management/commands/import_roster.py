@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import roster
+
+
+class Command(BaseCommand):
+    help = 'Bulk import ValidStudent or ValidStaff records from a CSV or JSONL file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(roster.ROSTERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=roster.DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--errors', help='Write the per-row error report to this JSON file.')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or roster.detect_format(options['path'])
+        try:
+            with open(options['path'], 'rb') as stream:
+                report = roster.import_roster(options['kind'], stream, file_format, options['chunk_size'])
+        except OSError as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+
+        if options['errors']:
+            with open(options['errors'], 'w') as out:
+                json.dump(report.errors, out, indent=2, default=str)
+        else:
+            for error in report.errors:
+                self.stderr.write(f"line {error['line']}: {error['errors']}")
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {report.imported} rows, {report.failed} failed.'))
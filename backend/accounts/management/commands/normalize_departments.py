@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import User, ValidStaff, ValidStudent, normalize_department
+
+
+class Command(BaseCommand):
+    help = 'Backfill the indexed department_key column on User, ValidStudent and ValidStaff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        for model in (User, ValidStudent, ValidStaff):
+            updated = 0
+            batch = []
+            # Walk by primary key so memory stays bounded on large tables
+            for obj in model.objects.only('id', 'department', 'department_key').order_by('id').iterator(chunk_size=batch_size):
+                key = normalize_department(obj.department)
+                if obj.department_key != key:
+                    obj.department_key = key
+                    batch.append(obj)
+                if len(batch) >= batch_size:
+                    updated += model.objects.bulk_update(batch, ['department_key'])
+                    batch = []
+            if batch:
+                updated += model.objects.bulk_update(batch, ['department_key'])
+
+            self.stdout.write(f'{model.__name__}: {updated} department keys updated.')
@@ -0,0 +1,52 @@
+''' Shared serializer helpers '''
+
+def parse_fields_param(request):
+    """
+    Read the optional ?fields=a,b,student.name projection from the query string.
+    Returns None when no projection was requested.
+    """
+    raw = request.query_params.get('fields') if request else None
+    if not raw:
+        return None
+    return [name.strip() for name in raw.split(',') if name.strip()]
+
+
+def split_fields(fields):
+    """
+    Split ['id', 'student.name', 'student.email'] into top level names and
+    per-field nested projections: ({'id', 'student'}, {'student': ['name', 'email']}).
+    """
+    top_level, nested = set(), {}
+    for name in fields:
+        head, _, rest = name.partition('.')
+        top_level.add(head)
+        if rest:
+            nested.setdefault(head, []).append(rest)
+    return top_level, nested
+
+
+class DynamicFieldsMixin:
+    """
+    Lets a serializer render only a subset of its fields, e.g.
+    RequestSerializer(qs, many=True, fields=['id', 'status', 'student.name']).
+    Unknown names are ignored so clients can't trigger errors with typos.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            self.restrict_fields(fields)
+
+    def restrict_fields(self, fields):
+        top_level, nested = split_fields(fields)
+        for name in list(self.fields):
+            if name not in top_level:
+                self.fields.pop(name)
+
+        for name, sub_fields in nested.items():
+            field = self.fields.get(name)
+            # many=True nested serializers wrap the real serializer in .child
+            field = getattr(field, 'child', field)
+            if isinstance(field, DynamicFieldsMixin):
+                field.restrict_fields(sub_fields)
@@ -4,8 +4,25 @@ from django.db import models
 from datetime import date, timedelta
 from django.utils import timezone
 
+def normalize_department(department):
+    # Case and spacing insensitive department key, so routing can use an indexed equality lookup
+    return ' '.join((department or '').split()).lower()
+
+
 class ClearanceType(models.Model):
     clearance_type = models.CharField(max_length=50, unique=True)
+
+    # Routing rules, compiled into clearance.routing's in-memory routing table
+    PRIORITY_CHOICES = [
+        ('high', 'High'),
+        ('medium', 'Medium'),
+        ('low', 'Low'),
+    ]
+    # project/lab style clearances are handled by staff of the student's own department
+    department_scoped = models.BooleanField(default=False)
+    priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='low')
+    # User.role of the accounts eligible to handle requests of this type
+    staff_role = models.CharField(max_length=20, default='staff')
     
     def __str__(self):
         return self.clearance_type
@@ -18,9 +35,12 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
     clearance_type = models.ForeignKey(ClearanceType, on_delete=models.SET_NULL, blank=True, null=True)
     department = models.CharField(max_length=100)
+    department_key = models.CharField(max_length=100, db_index=True, editable=False, default='')
     
     phone = models.CharField(max_length=20, blank=True, null=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # Square resized copies of avatar, filled in the background by accounts.avatars
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.TextField(blank=True, null=True)
     course = models.CharField(max_length=100, blank=True, null=True)
     year = models.IntegerField(blank=True, null=True)
@@ -31,15 +51,40 @@ class User(AbstractUser):
     credits = models.CharField(max_length=20, blank=True, null=True)
     position = models.CharField(max_length=100, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # assigned-students keyset: students of a department ordered by enrollment number
+            models.Index(fields=['role', 'department_key', 'username'], name='user_role_dept_username_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.department_key = normalize_department(self.department)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.username} ({self.role})"
     
+def expected_graduation_for(admission_date):
+    # admission + 4 years, a 29 February admission graduates on 28 February
+    try:
+        return admission_date.replace(year=admission_date.year + 4)
+    except ValueError:
+        return admission_date.replace(year=admission_date.year + 4, day=28)
+
+
+def academic_progress(admission_date, today):
+    # (year of study, semester) for a student admitted on admission_date
+    delta = (today.year - admission_date.year) * 12 + (today.month - admission_date.month)
+    return min(4, (delta // 12) + 1), min(8, (delta // 6) + 1)
+
+
 ''' Only for validation during account activation '''
 class ValidStudent(models.Model):
     enrollment_number = models.CharField(max_length=20, unique=True)
     university_email = models.EmailField(max_length=100, unique=True)
     name = models.CharField(max_length=100)
     department = models.CharField(max_length=100)
+    department_key = models.CharField(max_length=100, db_index=True, editable=False, default='')
     
     course = models.CharField(max_length=100)
     admission_date = models.DateField()
@@ -47,38 +92,53 @@ class ValidStudent(models.Model):
     credits = models.CharField(max_length=20)
     phone = models.CharField(max_length=20)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # Square resized copies of avatar, filled in the background by accounts.avatars
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.TextField(blank=True, null=True)
     
     status = models.CharField(max_length=20, default='active')
 
-    def save(self, *args, **kwargs):
+    def set_derived_fields(self, today=None):
+        """
+        Fill department_key, expected_graduation, year and semester. Called by save()
+        and, with a shared `today`, by the bulk roster import which bypasses save().
+        """
+        self.department_key = normalize_department(self.department)
+
         # To auto-set graduation (admission + 4 years)
-        if not self.expected_graduation:
-            self.expected_graduation = self.admission_date.replace(year=self.admission_date.year + 4)
+        if not self.expected_graduation and self.admission_date:
+            self.expected_graduation = expected_graduation_for(self.admission_date)
 
         # Auto-calculate current year and semester based on current date
-        today = timezone.now().date()
         if self.admission_date:
-            delta = (today.year - self.admission_date.year) * 12 + (today.month - self.admission_date.month)
-            self.year = min(4, (delta // 12) + 1)
-            self.semester = min(8, (delta // 6) + 1)
+            self.year, self.semester = academic_progress(self.admission_date, today or timezone.now().date())
 
+    def save(self, *args, **kwargs):
+        self.set_derived_fields()
         super().save(*args, **kwargs)
 
     expected_graduation = models.DateField(blank=True, null=True)
     year = models.PositiveSmallIntegerField(blank=True, null=True)
     semester = models.PositiveSmallIntegerField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'department_key', 'enrollment_number'], name='validstudent_dept_enr_idx'),
+        ]
+
 
 class ValidStaff(models.Model):
     staff_id = models.CharField(max_length=20, unique=True)
     university_email = models.EmailField(max_length=100, unique=True)
     name = models.CharField(max_length=100)
     department = models.CharField(max_length=100)
+    department_key = models.CharField(max_length=100, db_index=True, editable=False, default='')
     clearance_type = models.ForeignKey(ClearanceType, on_delete=models.SET_NULL, blank=True, null=True)
     
     phone = models.CharField(max_length=20, blank=False, null=False)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # Square resized copies of avatar, filled in the background by accounts.avatars
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.TextField(blank=True, null=True)
     position = models.CharField(max_length=100, blank=True, null=True)
     
@@ -93,5 +153,24 @@ class ValidStaff(models.Model):
     # Eligible to activate (recognised by institution)
     status = models.CharField(max_length=20, default='active')
 
+    def save(self, *args, **kwargs):
+        self.department_key = normalize_department(self.department)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.name} ({self.staff_id})"
+
+
+# One-time token handed out by the bulk cohort activation instead of a password
+class ActivationToken(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='activation_token')
+    token_hash = models.CharField(max_length=128)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    used_at = models.DateTimeField(blank=True, null=True)
+
+    def is_usable(self):
+        return self.used_at is None and self.expires_at > timezone.now()
+
     def __str__(self):
-        return f"{self.name} ({self.staff_id})"
\ No newline at end of file
+        return f"Activation token for {self.user.username}"
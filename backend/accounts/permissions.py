@@ -0,0 +1,52 @@
+from functools import lru_cache
+
+from django.conf import settings
+from rolepermissions.checkers import has_permission, has_role
+from rolepermissions.roles import RolesManager
+
+from .authentication import resolve_user
+
+'''
+Role and permission checks resolved from User.role.
+
+The role column already says which accounts.roles class a user has, and the
+permissions of a role are fixed by its class definition, so both checks are
+answered from memory without touching the auth group and permission tables.
+Users whose role isn't a registered role fall back to the rolepermissions
+checkers, which read those tables.
+'''
+
+@lru_cache(maxsize=None)
+def role_permissions(role):
+    """ Permission names granted by default to `role`, None if it isn't a registered role. """
+    role_cls = RolesManager.retrieve_role(role) if role else None
+    if role_cls is None:
+        return None
+    return frozenset(name for name, default in role_cls.available_permissions.items() if default)
+
+
+def _superpowers(user):
+    # Same rule as rolepermissions: superusers pass every check unless disabled
+    return getattr(settings, 'ROLEPERMISSIONS_SUPERUSER_SUPERPOWERS', True) and user.is_superuser
+
+
+def user_has_permission(user, permission_name):
+    if not user or not user.is_authenticated:
+        return False
+    if _superpowers(user):
+        return True
+    permissions = role_permissions(user.role)
+    if permissions is None:
+        return has_permission(resolve_user(user), permission_name)
+    return permission_name in permissions
+
+
+def user_has_role(user, roles):
+    """ `roles` is a role name or a list of them, like rolepermissions.checkers.has_role. """
+    if not user or not user.is_authenticated:
+        return False
+    if _superpowers(user):
+        return True
+    if role_permissions(user.role) is None:
+        return has_role(resolve_user(user), roles)
+    return user.role in (roles if isinstance(roles, (list, tuple)) else [roles])
@@ -0,0 +1,225 @@
+import codecs
+import csv
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import clearance_types
+from .models import (
+    ClearanceType, ValidStaff, ValidStudent, academic_progress, expected_graduation_for, normalize_department,
+)
+
+'''
+Streaming bulk import of the activation whitelists (ValidStudent / ValidStaff).
+
+Rows are read lazily from CSV or JSONL, validated and upserted chunk by chunk with
+bulk_create(update_conflicts=True), so memory stays bounded by the chunk size.
+'''
+
+DEFAULT_CHUNK_SIZE = 1000
+# Keep the per-row error report bounded on badly broken files
+MAX_REPORTED_ERRORS = 1000
+
+
+@dataclass(frozen=True)
+class RosterSpec:
+    model: type
+    key: str
+    required: tuple
+    optional: tuple
+
+
+ROSTERS = {
+    'students': RosterSpec(
+        model=ValidStudent,
+        key='enrollment_number',
+        required=('enrollment_number', 'university_email', 'name', 'department', 'course',
+                  'admission_date', 'gpa', 'credits', 'phone'),
+        optional=('bio', 'status', 'expected_graduation'),
+    ),
+    'staff': RosterSpec(
+        model=ValidStaff,
+        key='staff_id',
+        required=('staff_id', 'university_email', 'name', 'department', 'phone'),
+        optional=('clearance_type', 'bio', 'position', 'role', 'status'),
+    ),
+}
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {'imported': self.imported, 'failed': self.failed, 'errors': self.errors}
+
+
+def detect_format(filename):
+    return 'jsonl' if filename and filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(stream, file_format):
+    """
+    Yield (line_number, row_dict) from a binary stream without loading it whole.
+    Rows that can't be parsed are yielded as (line_number, error_message).
+    """
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    if file_format == 'jsonl':
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, f'Invalid JSON: {e}'
+                continue
+            yield line_number, row if isinstance(row, dict) else 'Each line must be a JSON object.'
+    else:
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def clean_row(spec, row):
+    """ Convert one raw row into model field values, raises ValidationError with per-field messages. """
+    values, errors = {}, {}
+    for name in spec.required + spec.optional:
+        raw = row.get(name)
+        raw = raw.strip() if isinstance(raw, str) else raw
+        if raw in (None, ''):
+            if name in spec.required:
+                errors[name] = ['This field is required.']
+            continue
+
+        if name == 'clearance_type':
+            try:
+                values['clearance_type_id'] = clearance_types.get_by_name(str(raw)).id
+            except ClearanceType.DoesNotExist:
+                errors[name] = [f'Unknown clearance type {raw!r}.']
+            continue
+
+        model_field = spec.model._meta.get_field(name)
+        try:
+            values[name] = model_field.clean(raw, None)
+        except ValidationError as e:
+            errors[name] = e.messages
+
+    if errors:
+        raise ValidationError(errors)
+    return values
+
+
+def derive_student_fields(students, today):
+    """
+    Compute the fields ValidStudent.save() would, for a whole chunk at once.
+    Progress only depends on the admission month, so it is computed once per month.
+    """
+    progress = {}
+    for student in students:
+        student.department_key = normalize_department(student.department)
+        admission = student.admission_date
+        if not student.expected_graduation:
+            student.expected_graduation = expected_graduation_for(admission)
+        month = (admission.year, admission.month)
+        if month not in progress:
+            progress[month] = academic_progress(admission, today)
+        student.year, student.semester = progress[month]
+
+
+def _upsert(spec, objs, update_fields):
+    kwargs = {'update_conflicts': True, 'update_fields': update_fields}
+    # MySQL upserts on any unique key and rejects an explicit conflict target
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs['unique_fields'] = [spec.key]
+    spec.model.objects.bulk_create(objs, **kwargs)
+
+
+def import_chunk(spec, chunk, report, today):
+    objs_by_key = {}
+    for line, row in chunk:
+        if isinstance(row, str):
+            report.add_error(line, {'row': [row]})
+            continue
+        try:
+            values = clean_row(spec, row)
+        except ValidationError as e:
+            report.add_error(line, e.message_dict)
+            continue
+        key = values[spec.key]
+        if key in objs_by_key:
+            # Upserting the same key twice in one statement fails on some databases, the later row wins
+            report.add_error(objs_by_key[key][0], {spec.key: ['Duplicate in file, a later row replaces this one.']})
+        objs_by_key[key] = (line, spec.model(**values))
+
+    # A university email used twice would fail the whole batch on its unique index. Compared
+    # case-insensitively, like MySQL's default collation. Within the file the first row keeps it
+    emails = {}
+    for key, (line, obj) in list(objs_by_key.items()):
+        email = obj.university_email.lower()
+        if email in emails:
+            del objs_by_key[key]
+            report.add_error(line, {'university_email': ['Already used by another row in this file.']})
+        else:
+            emails[email] = key
+
+    file_emails = [obj.university_email for _, obj in objs_by_key.values()]
+    taken = spec.model.objects.filter(university_email__in=file_emails).exclude(
+        **{f'{spec.key}__in': list(objs_by_key)}
+    ).values_list('university_email', flat=True)
+    for email in taken:
+        key = emails.get(email.lower())
+        if key in objs_by_key:
+            line, _ = objs_by_key.pop(key)
+            report.add_error(line, {'university_email': ['Already used by another record.']})
+
+    objs = [obj for _, obj in objs_by_key.values()]
+    if not objs:
+        return
+
+    if spec.model is ValidStudent:
+        derive_student_fields(objs, today)
+    else:
+        # All ValidStaff.save() derives
+        for obj in objs:
+            obj.department_key = normalize_department(obj.department)
+    update_fields = [
+        f.name for f in spec.model._meta.concrete_fields
+        if not f.primary_key and f.name not in (spec.key, 'avatar', 'avatar_variants')
+    ]
+    with transaction.atomic():
+        _upsert(spec, objs, update_fields)
+    report.imported += len(objs)
+
+
+def import_roster(kind, stream, file_format='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Import a 'students' or 'staff' roster from a binary stream of CSV or JSONL rows.
+    Existing records are updated in place, keyed on enrollment number / staff id.
+    """
+    spec = ROSTERS[kind]
+    report = ImportReport()
+    today = timezone.now().date()
+    for chunk in chunked(read_rows(stream, file_format), chunk_size):
+        import_chunk(spec, chunk, report, today)
+    return report
@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from accounts.models import *
+from accounts import avatars
+from accounts.mixins import DynamicFieldsMixin
 
 class ActivationSerializer(serializers.Serializer):
     email = serializers.EmailField()
@@ -10,7 +12,7 @@ class ActivationSerializer(serializers.Serializer):
     clearance_type = serializers.CharField(required=False, allow_blank=True)
     
 # For get requests to view current details
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     id_number = serializers.SerializerMethodField()
     avatar = serializers.SerializerMethodField()
     name = serializers.SerializerMethodField()
@@ -35,10 +37,9 @@ class UserSerializer(serializers.ModelSerializer):
         return obj.get_full_name()
 
     def get_avatar(self, obj):
+        # ?size=small|medium|large picks a resized variant, the original otherwise
         request = self.context.get('request')
-        if obj.avatar and hasattr(obj.avatar, 'url'):
-            return request.build_absolute_uri(obj.avatar.url) if request else obj.avatar.url
-        return None
+        return avatars.avatar_url(request, obj.avatar.name, obj.avatar_variants, avatars.requested_size(request))
     
 # Simple serializer for user updates
 class UserUpdateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import avatars, clearance_types
+from .models import ClearanceType, User, ValidStaff, ValidStudent
+
+
+@receiver(post_save, sender=ClearanceType)
+@receiver(post_delete, sender=ClearanceType)
+def invalidate_clearance_types(sender, **kwargs):
+    clearance_types.invalidate()
+
+
+def _avatar_name(instance):
+    # Through __dict__ so a deferred avatar isn't fetched for every loaded row
+    value = instance.__dict__.get('avatar')
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=ValidStudent)
+@receiver(post_init, sender=ValidStaff)
+def remember_avatar(sender, instance, **kwargs):
+    instance._saved_avatar = _avatar_name(instance) if instance.pk else ''
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=ValidStudent)
+@receiver(post_save, sender=ValidStaff)
+def resize_changed_avatar(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'avatar' not in update_fields:
+        return
+    name = _avatar_name(instance)
+    if name and name != instance._saved_avatar and name != instance.avatar_variants.get('source'):
+        avatars.schedule(instance)
+    instance._saved_avatar = name
@@ -1,3 +1,349 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from datetime import date, timedelta
+from importlib.util import find_spec
+from io import BytesIO, StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from clearance import routing
+from . import activation, avatars, blacklist, clearance_types, roster
+from .models import ActivationToken, ClearanceType, User, ValidStaff, ValidStudent
+from .permissions import user_has_permission, user_has_role
+from .tokens import ClearanceRefreshToken
+
+
+class BackfillClearanceRoutingTests(TestCase):
+    def test_restores_legacy_rules_on_defaulted_rows(self):
+        for name in ('project', 'lab', 'library', 'hostel'):
+            ClearanceType.objects.create(clearance_type=name)
+
+        call_command('backfill_clearance_routing', stdout=StringIO())
+
+        rules = {
+            name: (routing.route_by_name(name).department_scoped, routing.route_by_name(name).priority)
+            for name in ('project', 'lab', 'library', 'hostel')
+        }
+        self.assertEqual(rules, {
+            'project': (True, 'high'),
+            'lab': (True, 'medium'),
+            'library': (False, 'medium'),
+            'hostel': (False, 'low'),
+        })
+
+
+class RefreshTokenClaimsTests(TestCase):
+    def setUp(self):
+        self.library = ClearanceType.objects.create(clearance_type='library')
+        self.user = User.objects.create_user(
+            username='staff1', password='secret', role='staff', department='Physics', clearance_type=self.library
+        )
+        self.refresh = ClearanceRefreshToken.for_user(self.user)
+
+    def test_refresh_picks_up_role_and_department_changes(self):
+        self.user.role = 'admin'
+        self.user.department = 'Computer Science'
+        self.user.clearance_type = None
+        self.user.save()
+
+        response = APIClient().post(reverse('token-refresh'), {'refresh': str(self.refresh)}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        for token in (AccessToken(response.data['access']), ClearanceRefreshToken(response.data['refresh'])):
+            self.assertEqual(token['role'], 'admin')
+            self.assertEqual(token['department'], 'Computer Science')
+            self.assertEqual(token['department_key'], 'computer science')
+            self.assertIsNone(token['clearance_type_id'])
+
+    def test_refresh_rejects_deactivated_user(self):
+        self.user.is_active = False
+        self.user.save()
+
+        response = APIClient().post(reverse('token-refresh'), {'refresh': str(self.refresh)}, format='json')
+
+        self.assertEqual(response.status_code, 401)
+
+
+class TokenBlacklistTests(TestCase):
+    """ Rotation and logout revoke refresh tokens in every TOKEN_BLACKLIST store. """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='student1', password='secret', role='student')
+
+    def refresh(self, token):
+        return APIClient().post(reverse('token-refresh'), {'refresh': token}, format='json')
+
+    def assertRevokes(self):
+        first = str(ClearanceRefreshToken.for_user(self.user))
+
+        rotated = self.refresh(first)
+        self.assertEqual(rotated.status_code, 200)
+        # The rotated token is blacklisted, its replacement works until logout
+        self.assertEqual(self.refresh(first).status_code, 401)
+        second = rotated.data['refresh']
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.post(reverse('logout'), {'refresh': second}, format='json').status_code, 205)
+        self.assertEqual(self.refresh(second).status_code, 401)
+
+    def test_database_store(self):
+        self.assertRevokes()
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+        self.assertEqual(BlacklistedToken.objects.count(), 2)
+
+    @override_settings(TOKEN_BLACKLIST={'BACKEND': 'accounts.blacklist.CacheBlacklist', 'OPTIONS': {}})
+    def test_cache_store(self):
+        self.assertRevokes()
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    @skipUnless(find_spec('fakeredis'), 'needs fakeredis')
+    @override_settings(TOKEN_BLACKLIST={
+        'BACKEND': 'accounts.blacklist.RedisBlacklist', 'OPTIONS': {'client': 'fakeredis.FakeRedis'},
+    })
+    def test_redis_store(self):
+        blacklist.get_store().client.flushall()
+        self.assertRevokes()
+        self.assertFalse(OutstandingToken.objects.exists())
+        # Entries expire together with the token they revoke
+        keys = blacklist.get_store().client.keys(blacklist.DEFAULT_KEY_PREFIX + '*')
+        self.assertEqual(len(keys), 2)
+        self.assertTrue(all(blacklist.get_store().client.ttl(key) > 0 for key in keys))
+
+    def test_prune_deletes_only_expired_tokens(self):
+        tokens = [ClearanceRefreshToken.for_user(self.user) for _ in range(3)]
+        for token in tokens[:2]:
+            token.blacklist()
+        OutstandingToken.objects.filter(jti__in=[token['jti'] for token in tokens[1:]]).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+
+        call_command('prune_token_blacklist', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [tokens[0]['jti']])
+        self.assertEqual(list(BlacklistedToken.objects.values_list('token__jti', flat=True)), [tokens[0]['jti']])
+
+
+class RolePermissionQueryTests(TestCase):
+    """ Role checks are answered from User.role, the rolepermissions tables stay untouched. """
+
+    def setUp(self):
+        cache.clear()
+        self.library = ClearanceType.objects.create(clearance_type='library')
+        self.staff = User.objects.create_user(
+            username='staff1', password='secret', role='staff', department='Physics', clearance_type=self.library
+        )
+
+    def test_checks_run_no_queries(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(user_has_permission(self.staff, 'view_assigned_requests'))
+            self.assertFalse(user_has_permission(self.staff, 'submit_request'))
+            self.assertTrue(user_has_role(self.staff, ['staff', 'admin']))
+            self.assertFalse(user_has_role(self.staff, 'student'))
+
+    def test_staff_stats_request_runs_only_its_aggregate(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClearanceRefreshToken.for_user(self.staff).access_token}')
+        # Fills the active flag cache and the clearance type registry
+        client.get(reverse('staff-clearance-stats'))
+
+        with self.assertNumQueries(1):
+            response = client.get(reverse('staff-clearance-stats'))
+        self.assertEqual(response.status_code, 200)
+
+
+class BulkActivationTests(TestCase):
+    def test_cohort_matches_department_ignoring_case_and_spacing(self):
+        admin = User.objects.create_user(username='admin1', role='admin', department='computer  science ')
+        for staff_id, department in (('S1', 'Computer Science'), ('S2', ' COMPUTER science'), ('S3', 'Physics')):
+            ValidStaff.objects.create(
+                staff_id=staff_id, university_email=f'{staff_id.lower()}@university.edu', name='Staff Member',
+                department=department, phone='0700000000',
+            )
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        response = client.post(reverse('admin-bulk-activate', args=['staff']), {}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(account['id_number'] for account in response.data['accounts']), ['S1', 'S2'])
+
+    def test_token_redeems_once(self):
+        ValidStaff.objects.create(
+            staff_id='S1', university_email='s1@university.edu', name='Staff Member',
+            department='Computer Science', phone='0700000000',
+        )
+        _, _, token = activation.activate_cohort('staff').issued[0]
+        self.assertEqual(len(ActivationToken.objects.get().token_hash), 64)
+        client = APIClient()
+        redeem = lambda token: client.post(
+            reverse('activate-redeem'), {'id_number': 'S1', 'token': token, 'password': 'chosen-pass'}, format='json'
+        )
+
+        self.assertEqual(redeem(token[:-1] + ('A' if token[-1] != 'A' else 'B')).status_code, 400)
+        self.assertEqual(redeem(token).status_code, 200)
+        self.assertEqual(redeem(token).status_code, 400)
+        self.assertTrue(User.objects.get(username='S1').check_password('chosen-pass'))
+
+
+class RosterImportTests(TestCase):
+    HEADER = 'enrollment_number,university_email,name,department,course,admission_date,gpa,credits,phone'
+
+    def student(self, number, email, **extra):
+        return {
+            'enrollment_number': number, 'university_email': email, 'name': 'Roster Student',
+            'department': 'Computer Science', 'course': 'BSc', 'admission_date': '2024-09-01', 'gpa': '3.10',
+            'credits': '60', 'phone': '0700000000', **extra,
+        }
+
+    def csv_file(self, rows):
+        lines = [self.HEADER] + [','.join(row[column] for column in self.HEADER.split(',')) for row in rows]
+        return ('\n'.join(lines) + '\n').encode()
+
+    def test_csv_upload_reports_duplicate_emails_per_row(self):
+        admin = User.objects.create_user(username='admin1', role='admin', department='Computer Science')
+        client = APIClient()
+        client.force_authenticate(admin)
+        upload = SimpleUploadedFile('students.csv', self.csv_file([
+            self.student('ENR001', 'one@university.edu'),
+            self.student('ENR002', 'ONE@university.edu'),
+            self.student('ENR003', 'three@university.edu', gpa='high'),
+            self.student('ENR004', 'four@university.edu'),
+        ]))
+
+        response = client.post(reverse('admin-roster-import', args=['students']), {'file': upload})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['imported'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        errors = {error['line']: list(error['errors']) for error in response.data['errors']}
+        self.assertEqual(errors, {3: ['university_email'], 4: ['gpa']})
+        self.assertEqual(sorted(ValidStudent.objects.values_list('enrollment_number', flat=True)), ['ENR001', 'ENR004'])
+
+    def test_jsonl_duplicates_within_and_across_chunks(self):
+        ValidStudent.objects.create(**{**self.student('ENR000', 'taken@university.edu'), 'admission_date': date(2024, 9, 1)})
+        rows = [
+            self.student('ENR001', 'one@university.edu'),
+            self.student('ENR002', 'one@university.edu'),
+            self.student('ENR003', 'taken@university.edu'),
+            self.student('ENR001', 'one@university.edu', name='Renamed Student'),
+        ]
+        stream = BytesIO(''.join(json.dumps(row) + '\n' for row in rows).encode())
+
+        report = roster.import_roster('students', stream, 'jsonl', chunk_size=2)
+
+        self.assertEqual((report.imported, report.failed), (2, 2))
+        self.assertEqual(
+            [(error['line'], list(error['errors'])) for error in report.errors],
+            [(2, ['university_email']), (3, ['university_email'])],
+        )
+        self.assertEqual(ValidStudent.objects.get(enrollment_number='ENR001').name, 'Renamed Student')
+        self.assertFalse(ValidStudent.objects.filter(enrollment_number__in=['ENR002', 'ENR003']).exists())
+
+
+class ClearanceTypeRegistryTests(TestCase):
+    def test_edit_is_visible_after_commit(self):
+        library = ClearanceType.objects.create(clearance_type='library')
+        before = clearance_types.snapshot()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            library.priority = 'high'
+            library.save()
+            # A request on another thread reloads before the commit and still reads the old row
+            clearance_types._snapshot = before
+            self.assertEqual(clearance_types.get_by_id(library.id).priority, 'low')
+
+        self.assertEqual(clearance_types.get_by_id(library.id).priority, 'high')
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class AvatarVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create_user(username='student1', role='student')
+
+    def photo(self, color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200), color).save(buffer, format='PNG')
+        return ContentFile(buffer.getvalue(), name='photo.png')
+
+    def set_avatar(self, instance, color='red'):
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.avatar = self.photo(color)
+            instance.save()
+        instance.refresh_from_db()
+
+    def test_variants_are_square_and_recorded(self):
+        self.set_avatar(self.user)
+
+        variants = self.user.avatar_variants
+        self.assertEqual(variants['source'], self.user.avatar.name)
+        for size, edge in avatars.AVATAR_SIZES.items():
+            with default_storage.open(variants[size], 'rb') as variant:
+                self.assertEqual(Image.open(variant).size, (edge, edge))
+
+    def test_urls_fall_back_to_the_original_until_variants_match(self):
+        self.set_avatar(self.user)
+        variants = self.user.avatar_variants
+
+        self.assertEqual(avatars.avatar_url(None, self.user.avatar.name, variants, 'small'), default_storage.url(variants['small']))
+        self.assertEqual(avatars.avatar_url(None, self.user.avatar.name, variants), default_storage.url(self.user.avatar.name))
+        # A newer avatar whose variants aren't built yet
+        self.assertEqual(avatars.avatar_url(None, 'avatars/new.png', variants, 'small'), default_storage.url('avatars/new.png'))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('user-profile'), {'size': 'medium'})
+        self.assertTrue(response.data['avatar'].endswith(default_storage.url(variants['medium'])))
+
+    def test_stale_task_leaves_newer_avatar_alone(self):
+        self.set_avatar(self.user)
+        first = self.user.avatar.name
+        with self.captureOnCommitCallbacks():
+            self.user.avatar = self.photo('blue')
+            self.user.save()
+
+        avatars.generate('accounts.User', self.user.pk, first)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar_variants['source'], first)
+        self.assertNotEqual(self.user.avatar.name, first)
+
+    def test_variants_are_served_as_immutable(self):
+        self.set_avatar(self.user)
+
+        response = self.client.get(default_storage.url(self.user.avatar_variants['small']))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_backfill_builds_missing_variants(self):
+        staff = ValidStaff.objects.create(
+            staff_id='S1', university_email='s1@university.edu', name='Staff Member',
+            department='Computer Science', phone='0700000000',
+        )
+        # update() skips the signal, like rows written before variants existed
+        ValidStaff.objects.filter(pk=staff.pk).update(avatar=default_storage.save('avatars/old.png', self.photo()))
+
+        call_command('generate_avatar_variants', stdout=StringIO())
+
+        staff.refresh_from_db()
+        self.assertEqual(staff.avatar_variants['source'], staff.avatar.name)
+        self.assertEqual(set(staff.avatar_variants), {'source', *avatars.AVATAR_SIZES})
@@ -0,0 +1,59 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, BlacklistMixin, RefreshToken
+
+from .blacklist import get_store
+
+'''
+JWTs carrying the user fields the clearance views read on every request, so
+accounts.authentication can authenticate without loading the User row.
+
+Claims are set when the refresh token is issued at login and rebuilt from the
+User row on every refresh (accounts.views.RefreshTokenView), so a role, department
+or clearance type change shows up once the current access token expires.
+
+Refresh token revocation goes through the store configured by TOKEN_BLACKLIST
+(see accounts.blacklist) instead of always writing simplejwt's tables.
+'''
+
+USER_CLAIMS = ('role', 'department', 'department_key', 'clearance_type_id')
+# User fields add_user_claims() reads
+CLAIM_FIELDS = ('id', *USER_CLAIMS, 'username', 'is_superuser')
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    token['username'] = user.username
+    token['is_superuser'] = user.is_superuser
+
+
+class ClearanceAccessToken(AccessToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        add_user_claims(token, user)
+        return token
+
+
+class ClearanceRefreshToken(RefreshToken):
+    access_token_class = ClearanceAccessToken
+
+    @classmethod
+    def for_user(cls, user):
+        # Skip BlacklistMixin.for_user, which always inserts an OutstandingToken row
+        token = super(BlacklistMixin, cls).for_user(user)
+        add_user_claims(token, user)
+        get_store().outstand(token, user)
+        return token
+
+    def check_blacklist(self):
+        if get_store().is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        get_store().blacklist(self)
+
+    def outstand(self, user=None):
+        get_store().outstand(self, user)
@@ -1,18 +1,22 @@
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path
 
+from accounts import async_views
 from accounts.views import *
 
+# ASGI deployments serve the read endpoints from accounts.async_views
+ASYNC_READ_VIEWS = getattr(settings, 'ASYNC_READ_VIEWS', False)
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
-    
     # Authentication
     path('activate/', ActivateAccountView.as_view(), name='activate'),
+    path('activate/redeem/', RedeemActivationTokenView.as_view(), name='activate-redeem'),
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
+    path('token/refresh/', RefreshTokenView.as_view(), name='token-refresh'),
     
     # User data
-    path('user/me/', MeView.as_view(), name='user-profile'),
+    path('user/me/', async_views.me if ASYNC_READ_VIEWS else MeView.as_view(), name='user-profile'),
     
     # Authenticated user updates their own profile
     path('profile/update/', UpdateDetailsView.as_view(), name='self-update'),
@@ -22,7 +26,11 @@ urlpatterns = [
     # Get users for admin user only
     path('admin/users/', UsersInDepartmentView.as_view(), name='admin-user-list'),
     # Deactivate account for admin only
-    path('admin/deactivate/', DeactivateUserView.as_view(), name='admin-deactivate-user'),
+    path('admin/deactivate/<int:pk>/', DeactivateUserView.as_view(), name='admin-deactivate-user'),
+    # Bulk import of the activation whitelists, kind is 'students' or 'staff'
+    path('admin/roster/<str:kind>/import/', RosterImportView.as_view(), name='admin-roster-import'),
+    # Bulk activation of a cohort with one-time tokens, kind is 'students' or 'staff'
+    path('admin/activate/<str:kind>/', BulkActivationView.as_view(), name='admin-bulk-activate'),
     
     # Change password for all authenticated users
     path('change_password/', ChangePasswordView.as_view(), name='change_password'),
@@ -4,12 +4,16 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.generics import RetrieveUpdateAPIView
 from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import TokenError
 from django.contrib.auth import get_user_model, authenticate
 from django.core.exceptions import ValidationError as DjangoValidationError
 
 from rolepermissions.roles import assign_role
-from .models import ValidStudent, ValidStaff
+from .models import ValidStudent, ValidStaff, normalize_department
+from . import activation, roster
+from .authentication import resolve_user, set_user_active
+from .tokens import CLAIM_FIELDS, ClearanceRefreshToken, add_user_claims
 from .serializers import *
 
 User = get_user_model()
@@ -42,6 +46,7 @@ class ActivateAccountView(APIView):
                         'department': student.department,
                         'phone': student.phone,
                         'avatar': student.avatar,
+                        'avatar_variants': student.avatar_variants,
                         'bio': student.bio,
                         'year': student.year,
                         'semester': student.semester,
@@ -76,9 +81,10 @@ class ActivateAccountView(APIView):
                         'department': staff.department,
                         'phone': staff.phone,
                         'avatar': staff.avatar,
+                        'avatar_variants': staff.avatar_variants,
                         'bio': staff.bio,
                         'position': staff.position,
-                        'clearance_type': staff.clearance_type,
+                        'clearance_type_id': staff.clearance_type_id,
                         'role': role
                     }
                 )
@@ -101,6 +107,25 @@ class ActivateAccountView(APIView):
             return Response({'error': f"Unexpected error during activation: {str(e)}"}, status=500)
 
 
+class RedeemActivationTokenView(APIView):
+    # Second half of the bulk cohort activation: the account owner picks a password
+    def post(self, request):
+        id_number = request.data.get('id_number')
+        token = request.data.get('token')
+        password = request.data.get('password')
+
+        if not all([id_number, token, password]):
+            return Response({'error': 'All fields are required.'}, status=400)
+
+        try:
+            user = activation.redeem_token(id_number, token, password)
+            if user is None:
+                return Response({'error': 'Invalid or expired activation token.'}, status=400)
+            return Response({'message': f'{user.role.capitalize()} account activated successfully!'}, status=200)
+        except Exception as e:
+            return Response({'error': f"Unexpected error during activation: {str(e)}"}, status=500)
+
+
 ###################################### LOGIN / LOGOUT ############################################
 
 class LoginView(APIView):
@@ -120,7 +145,7 @@ class LoginView(APIView):
                 return Response({'error': 'Account is deactivated.'}, status=403)
 
             serializer = UserSerializer(user, context={'request': request})
-            refresh = RefreshToken.for_user(user)
+            refresh = ClearanceRefreshToken.for_user(user)
 
             return Response({
                 'refresh': str(refresh),
@@ -141,7 +166,7 @@ class LogoutView(APIView):
             if not refresh_token:
                 return Response({"error": "Refresh token required."}, status=400)
 
-            RefreshToken(refresh_token).blacklist()
+            ClearanceRefreshToken(refresh_token).blacklist()
             return Response({"message": "Logged out successfully."}, status=205)
 
         except TokenError:
@@ -150,6 +175,43 @@ class LogoutView(APIView):
             return Response({"error": f"Logout failed: {str(e)}"}, status=500)
 
 
+class RefreshTokenView(APIView):
+    def post(self, request):
+        try:
+            refresh_token = request.data.get("refresh")
+            if not refresh_token:
+                return Response({"error": "Refresh token required."}, status=400)
+
+            refresh = ClearanceRefreshToken(refresh_token)
+            user_id = refresh[jwt_settings.USER_ID_CLAIM]
+            # One row read covers the active check and the current claims
+            user = User.objects.filter(pk=user_id, is_active=True).only(*CLAIM_FIELDS).first()
+            set_user_active(user_id, user is not None)
+            if user is None:
+                return Response({"error": "Account is deactivated."}, status=401)
+
+            if jwt_settings.ROTATE_REFRESH_TOKENS and jwt_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            # Role, department and clearance type changes reach the new access token
+            add_user_claims(refresh, user)
+
+            data = {'access': str(refresh.access_token)}
+            if jwt_settings.ROTATE_REFRESH_TOKENS:
+                # Current claims, new identity and lifetime
+                refresh.set_jti()
+                refresh.set_exp()
+                refresh.set_iat()
+                refresh.outstand(user)
+                data['refresh'] = str(refresh)
+
+            return Response(data, status=200)
+
+        except TokenError:
+            return Response({"error": "Invalid or expired token."}, status=401)
+        except Exception as e:
+            return Response({"error": f"Token refresh failed: {str(e)}"}, status=500)
+
+
 ######################################### PROFILE MANAGEMENT ######################################
 
 class MeView(APIView):
@@ -157,7 +219,7 @@ class MeView(APIView):
 
     def get(self, request):
         try:
-            serializer = UserSerializer(request.user, context={'request': request})
+            serializer = UserSerializer(resolve_user(request.user), context={'request': request})
             return Response(serializer.data)
         except Exception as e:
             return Response({'error': f"Could not retrieve user data: {str(e)}"}, status=500)
@@ -174,7 +236,7 @@ class UpdateDetailsView(RetrieveUpdateAPIView):
         return UserSerializer if self.request.user.role == 'admin' else UserUpdateSerializer
 
     def get_object(self):
-        user = self.request.user
+        user = resolve_user(self.request.user)
         requested_id = self.kwargs.get('pk')
 
         try:
@@ -241,6 +303,8 @@ class DeactivateUserView(APIView):
 
             user.is_active = False
             user.save()
+            # Stateless JWTs stay valid until they expire, the cached flag shuts them out
+            set_user_active(user.id, False)
             return Response({'message': 'User deactivated successfully.'})
 
         except User.DoesNotExist:
@@ -248,12 +312,59 @@ class DeactivateUserView(APIView):
         except Exception as e:
             return Response({'error': f"Deactivation failed: {str(e)}"}, status=500)
 
+class RosterImportView(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request, kind):
+        if request.user.role != 'admin':
+            return Response({'error': 'Only admins can import rosters.'}, status=403)
+
+        if kind not in roster.ROSTERS:
+            return Response({'error': f"Unknown roster {kind!r}, expected one of {sorted(roster.ROSTERS)}."}, status=400)
+
+        uploaded_file = request.FILES.get('file')
+        if not uploaded_file:
+            return Response({'error': 'A CSV or JSONL file is required.'}, status=400)
+
+        try:
+            file_format = request.data.get('format') or roster.detect_format(uploaded_file.name)
+            report = roster.import_roster(kind, uploaded_file, file_format)
+            return Response(report.as_dict(), status=200)
+        except Exception as e:
+            return Response({'error': f"Roster import failed: {str(e)}"}, status=500)
+
+class BulkActivationView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, kind):
+        if request.user.role != 'admin':
+            return Response({'error': 'Only admins can activate accounts.'}, status=403)
+
+        if kind not in activation.COHORTS:
+            return Response({'error': f"Unknown cohort {kind!r}, expected one of {sorted(activation.COHORTS)}."}, status=400)
+
+        cohort = activation.COHORTS[kind]
+        # An admin onboards their own department, optionally only the listed id numbers
+        records = cohort.model.objects.filter(department_key=normalize_department(request.user.department))
+        id_numbers = request.data.get('id_numbers')
+        if id_numbers is not None:
+            if not isinstance(id_numbers, list):
+                return Response({'error': 'id_numbers must be a list.'}, status=400)
+            records = records.filter(**{f'{cohort.key}__in': id_numbers})
+
+        try:
+            result = activation.activate_cohort(kind, records)
+            return Response(result.as_dict(), status=201 if result.activated else 200)
+        except Exception as e:
+            return Response({'error': f"Bulk activation failed: {str(e)}"}, status=500)
+
 ######################################## CHANGE PASSWORD ###########################################
 class ChangePasswordView(APIView):
     permission_classes = [IsAuthenticated]
 
     def put(self, request):
-        user = request.user
+        user = resolve_user(request.user)
         current_password = request.data.get('current_password')
         new_password = request.data.get('new_password')
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ClearanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clearance'
+
+    def ready(self):
+        import clearance.signals  # registers the request counter receivers
\ No newline at end of file
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db.models import Count, Q
+
+from accounts.models import User
+from .models import Request
+
+'''
+Picks the staff member who owns a request when it is submitted.
+
+CLEARANCE_ASSIGNMENT_STRATEGY selects how:
+- 'least_loaded': the eligible staff member with the fewest pending assigned requests
+- 'round_robin': the eligible staff member after whoever got the previous request of this type
+Ties and wrap-arounds are broken by user id, so the choice is deterministic.
+'''
+
+STRATEGIES = ('least_loaded', 'round_robin')
+
+
+def get_strategy():
+    strategy = getattr(settings, 'CLEARANCE_ASSIGNMENT_STRATEGY', 'least_loaded')
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown CLEARANCE_ASSIGNMENT_STRATEGY {strategy!r}, expected one of {STRATEGIES}.")
+    return strategy
+
+
+def eligible_staff(route, department_key):
+    return User.objects.filter(route.staff_filter(department_key))
+
+
+def least_loaded(candidates):
+    return (
+        candidates
+        .annotate(outstanding=Count('assigned_requests', filter=Q(assigned_requests__status='pending')))
+        .order_by('outstanding', 'id')
+        .first()
+    )
+
+
+def round_robin(candidates, route):
+    last_staff_id = (
+        Request.objects.filter(clearance_type_id=route.clearance_type_id, assigned_staff__in=candidates)
+        .order_by('-id')
+        .values_list('assigned_staff_id', flat=True)
+        .first()
+    )
+    if last_staff_id is not None:
+        following = candidates.filter(id__gt=last_staff_id).order_by('id').first()
+        if following is not None:
+            return following
+    return candidates.order_by('id').first()
+
+
+def pick_staff(route, department_key):
+    """
+    Return the staff User who should own a new request of this route from a
+    student of this department, or None when nobody is eligible.
+    """
+    candidates = eligible_staff(route, department_key)
+    if get_strategy() == 'round_robin':
+        return round_robin(candidates, route)
+    return least_loaded(candidates)
@@ -0,0 +1,143 @@
+import asyncio
+
+from django.db.models import Count, Q
+from rest_framework import status
+
+from accounts import clearance_types
+from accounts.async_api import async_api_view, in_thread
+from accounts.mixins import parse_fields_param
+from accounts.models import ValidStudent
+from accounts.permissions import user_has_permission, user_has_role
+from . import dashboards, routing
+from .models import Request
+from .pagination import InvalidCursor, paginate_requests, wants_pagination
+from .queries import request_list_queryset
+from .serializers import RequestSerializer
+
+'''
+Async counterparts of the read-heavy clearance views, same URLs and responses.
+clearance.urls routes to them when ASYNC_READ_VIEWS is set, for ASGI deployments;
+under WSGI the APIView versions in clearance.views are cheaper.
+'''
+
+
+def _serialize_requests(request, queryset, fields=None):
+    return RequestSerializer(queryset, many=True, fields=fields, context={'request': request}).data
+
+
+def _has_student_profile(user):
+    # email isn't a token claim, reading it loads the User row
+    return ValidStudent.objects.filter(university_email=user.email).exists()
+
+
+def _student_counts(user):
+    return Request.objects.filter(student_id=user.id).aggregate(
+        approved=Count('id', filter=Q(status='approved')),
+        pending=Count('id', filter=Q(status='pending')),
+        rejected=Count('id', filter=Q(status='rejected')),
+    )
+
+
+########################################### STUDENT VIEWS #############################################
+
+@async_api_view
+async def request_status(request):
+    user = request.user
+    if user.role != 'student':
+        return {'error': 'Only students can view their clearance requests.'}, status.HTTP_403_FORBIDDEN
+
+    pending_requests = request_list_queryset(Request.objects.filter(student_id=user.id, status='pending'), user=user)
+    return await in_thread(_serialize_requests, request, pending_requests), status.HTTP_200_OK
+
+
+@async_api_view
+async def student_clearance_stats(request):
+    user = request.user
+    if user.role != 'student':
+        return {'error': 'Only students can access their clearance stats.'}, status.HTTP_403_FORBIDDEN
+
+    # The type registry and the student's counts don't depend on each other
+    total_required, stats = await asyncio.gather(in_thread(clearance_types.count), in_thread(_student_counts, user))
+    approved = stats['approved']
+
+    percentage = round((approved / total_required) * 100) if total_required > 0 else 0
+    return {
+        'completed': approved,
+        'pending': stats['pending'],
+        'total': total_required,
+        'percentage': percentage,
+    }, status.HTTP_200_OK
+
+
+@async_api_view
+async def student_history(request):
+    user = request.user
+    if user.role != 'student':
+        return {'error': 'Access denied. Only students can view their history.'}, status.HTTP_403_FORBIDDEN
+
+    completed_requests = request_list_queryset(
+        Request.objects.filter(student_id=user.id, status__in=['approved', 'rejected']), user=user
+    )
+    # Profile check and history fetch overlap, the history is dropped if there is no profile
+    has_profile, data = await asyncio.gather(
+        in_thread(_has_student_profile, user),
+        in_thread(_serialize_requests, request, completed_requests),
+    )
+    if not has_profile:
+        return {'error': 'Student profile not found.'}, status.HTTP_404_NOT_FOUND
+    return data, status.HTTP_200_OK
+
+
+########################################### STAFF VIEWS #############################################
+
+def _assigned_requests_page(request, user):
+    if request.query_params.get('scope') == 'all':
+        route = routing.route_for(user.clearance_type_id)
+        requests = Request.objects.filter(route.request_filter(user))
+    else:
+        requests = Request.objects.filter(assigned_staff_id=user.id)
+
+    fields = parse_fields_param(request)
+    requests = request_list_queryset(requests, fields=fields, user=user)
+    if not wants_pagination(request):
+        return _serialize_requests(request, requests, fields)
+
+    page, next_cursor = paginate_requests(request, requests)
+    return {'results': _serialize_requests(request, page, fields), 'next_cursor': next_cursor}
+
+
+@async_api_view
+async def assigned_requests(request):
+    user = request.user
+    if not user_has_permission(user, 'view_assigned_requests'):
+        return {'error': 'Permission denied.'}, status.HTTP_403_FORBIDDEN
+    if user.role != 'staff':
+        return {'error': 'Only staff can view assigned requests.'}, status.HTTP_403_FORBIDDEN
+    if not user.clearance_type_id:
+        return {'error': 'You are not assigned to any clearance type.'}, status.HTTP_400_BAD_REQUEST
+
+    try:
+        return await in_thread(_assigned_requests_page, request, user), status.HTTP_200_OK
+    except InvalidCursor as e:
+        return {'error': str(e)}, status.HTTP_400_BAD_REQUEST
+
+
+@async_api_view
+async def staff_clearance_stats(request):
+    user = request.user
+    if not user_has_role(user, 'staff'):
+        return {'error': 'You do not have permission to access staff clearance statistics.'}, status.HTTP_403_FORBIDDEN
+    if not user.clearance_type_id:
+        return {'error': 'No clearance type assigned to this staff member.'}, status.HTTP_400_BAD_REQUEST
+
+    stats = await in_thread(dashboards.staff_counts, user.clearance_type_id)
+    total_students = stats['total']
+    cleared_students = stats['approved']
+
+    percentage_cleared = int((cleared_students / total_students) * 100) if total_students > 0 else 0
+    return {
+        'totalStudents': total_students,
+        'clearedStudents': cleared_students,
+        'pendingStudents': stats['pending'],
+        'percentage': percentage_cleared,
+    }, status.HTTP_200_OK
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import Request, RequestCounter
+
+''' Materialized per-(clearance_type, department, status) request counters '''
+
+def counters_enabled():
+    return getattr(settings, 'CLEARANCE_STATS_COUNTERS', False)
+
+
+def adjust(clearance_type_id, department, status, delta):
+    if not delta:
+        return
+    updated = RequestCounter.objects.filter(
+        clearance_type_id=clearance_type_id, department=department, status=status
+    ).update(count=F('count') + delta)
+
+    if not updated:
+        # First request for this bucket, create the row then apply the delta atomically
+        counter, _ = RequestCounter.objects.get_or_create(
+            clearance_type_id=clearance_type_id, department=department, status=status
+        )
+        RequestCounter.objects.filter(pk=counter.pk).update(count=F('count') + delta)
+
+
+def record_transition(clearance_type_id, department, old_status, new_status, count=1):
+    """
+    Move `count` requests from old_status to new_status. Use old_status=None for
+    newly created requests and new_status=None for deleted ones.
+    """
+    if not counters_enabled() or old_status == new_status:
+        return
+    if old_status is not None:
+        adjust(clearance_type_id, department, old_status, -count)
+    if new_status is not None:
+        adjust(clearance_type_id, department, new_status, count)
+
+
+def staff_stats(clearance_type_id):
+    # At most (departments x statuses) rows, independent of the number of requests
+    rows = (
+        RequestCounter.objects.filter(clearance_type_id=clearance_type_id)
+        .values('status')
+        .annotate(total=Sum('count'))
+    )
+    by_status = {row['status']: row['total'] for row in rows}
+    return {
+        'total': sum(by_status.values()),
+        'approved': by_status.get('approved', 0),
+        'pending': by_status.get('pending', 0),
+    }
+
+
+@transaction.atomic
+def rebuild():
+    """ Recompute every counter from the request table. """
+    RequestCounter.objects.all().delete()
+    rows = (
+        Request.objects.values('clearance_type_id', 'student__department_key', 'status')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    RequestCounter.objects.bulk_create([
+        RequestCounter(
+            clearance_type_id=row['clearance_type_id'],
+            department=row['student__department_key'],
+            status=row['status'],
+            count=row['total'],
+        )
+        for row in rows
+    ])
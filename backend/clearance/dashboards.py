@@ -0,0 +1,137 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils.http import parse_etags, quote_etag
+
+from accounts import clearance_types
+from accounts.authentication import resolve_user
+from accounts.serializers import UserSerializer
+from . import counters
+from .models import Request
+from .pagination import paginate_requests
+from .queries import request_list_queryset
+from .serializers import RequestSerializer
+
+'''
+One-round-trip dashboards with conditional GET, for students and staff.
+
+Each dashboard has a cheap change token: an aggregate over the rows it shows
+(count and latest Request.updated_at), plus whatever else appears in the payload.
+Views compare it with If-None-Match before building anything, so an unchanged
+dashboard costs the token queries and a 304.
+
+Request rows show their clearance type's name and priority, so tokens include the
+type registry's fingerprint. It changes with any type edit this process has loaded,
+whether or not CLEARANCE_TYPE_REGISTRY_SHARED is on.
+
+Payloads carry signed document links (clearance.downloads) that expire, so tokens
+also roll over every half DOCUMENT_LINK_MAX_AGE. A cached copy never holds a link
+with less than half its lifetime left.
+'''
+
+
+def _link_epoch():
+    return int(time.time() // max(1, getattr(settings, 'DOCUMENT_LINK_MAX_AGE', 3600) // 2))
+
+
+def make_etag(*parts):
+    raw = '|'.join(str(part) for part in (*parts, _link_epoch(), clearance_types.snapshot().fingerprint))
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def is_not_modified(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    return bool(if_none_match) and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*')
+
+
+########################################### STUDENT #############################################
+
+def student_dashboard_etag(request, user):
+    """ (etag, profile data): the profile is part of the token, and reused by the dashboard. """
+    profile = UserSerializer(resolve_user(user), context={'request': request}).data
+    state = Request.objects.filter(student_id=user.id).aggregate(count=Count('id'), updated=Max('updated_at'))
+    return make_etag('student', user.id, state['count'], state['updated'], sorted(profile.items())), profile
+
+
+def student_dashboard(request, user, profile):
+    """ Stats, pending requests and history from one fetch of the student's requests. """
+    requests = RequestSerializer(
+        request_list_queryset(Request.objects.filter(student_id=user.id), user=user),
+        many=True, context={'request': request},
+    ).data
+
+    pending = [item for item in requests if item['status'] == 'pending']
+    history = [item for item in requests if item['status'] in ('approved', 'rejected')]
+    approved = sum(1 for item in history if item['status'] == 'approved')
+    total_required = clearance_types.count()
+
+    return {
+        'profile': profile,
+        'stats': {
+            'completed': approved,
+            'pending': len(pending),
+            'total': total_required,
+            'percentage': round((approved / total_required) * 100) if total_required > 0 else 0,
+        },
+        'pending': pending,
+        'history': history,
+    }
+
+
+########################################### STAFF #############################################
+
+# Decisions listed under "recent history"
+STAFF_HISTORY_LIMIT = 20
+
+
+def staff_counts(clearance_type_id):
+    """ Totals over a clearance type, from the materialized counters when enabled. """
+    if counters.counters_enabled():
+        return counters.staff_stats(clearance_type_id)
+    return Request.objects.filter(clearance_type_id=clearance_type_id).aggregate(
+        total=Count('id'),
+        approved=Count('id', filter=Q(status='approved')),
+        pending=Count('id', filter=Q(status='pending')),
+    )
+
+
+def staff_dashboard_etag(user):
+    """
+    Token over the staff member's clearance type. Queue, history and counters all
+    come from that type's requests, and decisions, reports and comments all bump
+    Request.updated_at, so one indexed aggregate notices any change.
+    """
+    state = Request.objects.filter(clearance_type_id=user.clearance_type_id).aggregate(
+        count=Count('id'), updated=Max('updated_at')
+    )
+    return make_etag('staff', user.id, user.clearance_type_id, state['count'], state['updated'])
+
+
+def staff_dashboard(request, user):
+    """ Pending queue (one keyset page), counters and recent decisions in a fixed number of queries. """
+    queue, next_cursor = paginate_requests(
+        request, request_list_queryset(Request.objects.filter(assigned_staff_id=user.id, status='pending'), user=user)
+    )
+    history = (
+        request_list_queryset(
+            Request.objects.filter(report__staff_id=user.id).exclude(report__status='pending'), user=user
+        ).order_by('-updated_at', '-id')[:STAFF_HISTORY_LIMIT]
+    )
+    stats = staff_counts(user.clearance_type_id)
+    context = {'request': request}
+
+    return {
+        'queue': {
+            'results': RequestSerializer(queue, many=True, context=context).data,
+            'next_cursor': next_cursor,
+        },
+        'stats': {
+            'totalStudents': stats['total'],
+            'clearedStudents': stats['approved'],
+            'pendingStudents': stats['pending'],
+            'percentage': int((stats['approved'] / stats['total']) * 100) if stats['total'] > 0 else 0,
+        },
+        'history': RequestSerializer(history, many=True, context=context).data,
+    }
@@ -0,0 +1,138 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import MultiPartParser
+
+from .models import DocumentBlob
+
+'''
+Streaming, content-addressed storage of clearance documents.
+
+DocumentMultiPartParser streams the upload to a temporary file through
+HashingFileUploadHandler, which sniffs the type from the first bytes, enforces the
+size limit as data arrives and computes the SHA-256 on the way. store_document()
+then moves the file to documents/ab/cd/<sha256>.<ext> unless the DocumentBlob
+index already has that content, in which case the upload is dropped and the
+existing file reused.
+'''
+
+# Leading bytes of each accepted document type: (content type, extension)
+DOCUMENT_SIGNATURES = {
+    b'%PDF-': ('application/pdf', 'pdf'),
+    b'\x89PNG\r\n\x1a\n': ('image/png', 'png'),
+    b'\xff\xd8\xff': ('image/jpeg', 'jpg'),
+}
+EXTENSIONS = dict(DOCUMENT_SIGNATURES.values())
+# Room for boundaries and the other form fields on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class DocumentRejected(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = 'Invalid document.'
+
+
+class DocumentTooLarge(DocumentRejected):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+    def __init__(self):
+        super().__init__(f'Documents can be at most {max_document_size() // (1024 * 1024)} MB.')
+
+
+class UnsupportedDocumentType(DocumentRejected):
+    status_code = status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+    default_detail = 'Only PDF, PNG and JPEG documents are accepted.'
+
+
+def max_document_size():
+    return getattr(settings, 'DOCUMENT_UPLOAD_MAX_SIZE', 200 * 1024 * 1024)
+
+
+def sniff_content_type(head):
+    for signature, (content_type, _) in DOCUMENT_SIGNATURES.items():
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Writes each uploaded file to a temporary file chunk by chunk, so memory use doesn't
+    depend on the file size, and rejects oversized or unsupported files as soon as
+    that is known. The resulting file has `sha256` and `document_type` attributes.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Declared body size, refused before any of it is read
+        if content_length and content_length > max_document_size() + MULTIPART_OVERHEAD:
+            raise DocumentTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.received = 0
+        self.document_type = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            self.document_type = sniff_content_type(raw_data)
+            if self.document_type is None:
+                raise UnsupportedDocumentType()
+        self.received += len(raw_data)
+        if self.received > max_document_size():
+            # Chunked bodies have no declared length, so the limit is also checked as data arrives
+            raise DocumentTooLarge()
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.document_type is None:
+            raise UnsupportedDocumentType()
+        file = super().file_complete(file_size)
+        file.sha256 = self.hasher.hexdigest()
+        file.document_type = self.document_type
+        return file
+
+
+class DocumentMultiPartParser(MultiPartParser):
+    """ MultiPartParser that always streams files through HashingFileUploadHandler. """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request.upload_handlers = [HashingFileUploadHandler(request._request)]
+        return super().parse(stream, media_type, parser_context)
+
+
+def blob_name(sha256, content_type):
+    return f'documents/{sha256[:2]}/{sha256[2:4]}/{sha256}.{EXTENSIONS[content_type]}'
+
+
+def store_document(file, sha256, content_type):
+    """
+    Store `file` under its content address and return the storage name to put in a
+    FileField. Identical content is stored once.
+    """
+    blob = DocumentBlob.objects.filter(sha256=sha256).first()
+    if blob is not None:
+        return blob.file.name
+
+    name = blob_name(sha256, content_type)
+    if not default_storage.exists(name):
+        saved = default_storage.save(name, file)
+        if saved != name:
+            # Another upload of the same content won the race, both files are identical
+            default_storage.delete(saved)
+
+    blob, _ = DocumentBlob.objects.get_or_create(
+        sha256=sha256, defaults={'file': name, 'size': file.size, 'content_type': content_type}
+    )
+    return blob.file.name
+
+
+def store_uploaded_document(uploaded_file):
+    """ store_document() for a file parsed by DocumentMultiPartParser. """
+    return store_document(uploaded_file, uploaded_file.sha256, uploaded_file.document_type)
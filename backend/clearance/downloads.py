@@ -0,0 +1,153 @@
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, HttpResponse
+from django.urls import reverse
+from django.utils.http import parse_etags, quote_etag
+
+'''
+Access-controlled delivery of request documents, report attachments and preview thumbnails.
+
+Documents are readable by the submitting student, the assigned or deciding staff
+member and admins of the student's department. Links handed out by the serializers
+carry a short-lived signed token, so they also work as plain browser links where no
+Authorization header is sent.
+
+With DOCUMENT_SENDFILE_HEADER set, the web server sends the file (X-Sendfile or
+nginx X-Accel-Redirect). Otherwise Django streams it with FileResponse, honouring
+Range, ETag and If-None-Match, without reading the file into memory.
+'''
+
+LINK_SALT = 'clearance.downloads'
+URL_NAMES = {'request': 'request-document', 'report': 'report-document', 'preview': 'request-preview'}
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def can_access(user, clearance_request):
+    if user.id in (clearance_request.student_id, clearance_request.assigned_staff_id):
+        return True
+    report = getattr(clearance_request, 'report', None)
+    if report is not None and report.staff_id == user.id:
+        return True
+    return user.role == 'admin' and user.department_key == clearance_request.student.department_key
+
+
+def document_url(request, clearance_request, kind='request'):
+    """ Signed download link for the current user, `kind` is a key of URL_NAMES. """
+    token = signing.dumps({'r': clearance_request.pk, 'k': kind, 'u': request.user.id}, salt=LINK_SALT)
+    url = reverse(URL_NAMES[kind], args=[clearance_request.pk])
+    return request.build_absolute_uri(f'{url}?token={token}')
+
+
+def read_link_token(token, request_id, kind):
+    """ Id of the user a link was issued to, None if it is invalid, expired or for another document. """
+    try:
+        data = signing.loads(token, salt=LINK_SALT, max_age=getattr(settings, 'DOCUMENT_LINK_MAX_AGE', 3600))
+    except signing.BadSignature:
+        return None
+    if data.get('r') != request_id or data.get('k') != kind:
+        return None
+    return data.get('u')
+
+
+def _etag(field_file):
+    storage, name = field_file.storage, field_file.name
+    try:
+        modified = storage.get_modified_time(name).timestamp()
+    except NotImplementedError:
+        modified = ''
+    return quote_etag(hashlib.md5(f'{name}:{field_file.size}:{modified}'.encode()).hexdigest())
+
+
+def _byte_range(header, size):
+    """ (start, end) inclusive for a single-range header, None to send everything, False if unsatisfiable. """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class RangeReader:
+    """ Read-only view of `length` bytes of a file, for FileResponse. """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def serve_file(request, field_file):
+    name = field_file.name
+    filename = os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    etag = _etag(field_file)
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    sendfile_header = getattr(settings, 'DOCUMENT_SENDFILE_HEADER', None)
+    if sendfile_header:
+        # The web server handles Range and streaming, Django only authorizes
+        response = HttpResponse(content_type=content_type)
+        if sendfile_header == 'X-Accel-Redirect':
+            response[sendfile_header] = settings.DOCUMENT_ACCEL_REDIRECT_PREFIX + quote(name)
+        else:
+            response[sendfile_header] = field_file.path
+    else:
+        size = field_file.size
+        byte_range = None
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range or if_range == etag:
+            byte_range = _byte_range(request.META.get('HTTP_RANGE'), size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        file = field_file.storage.open(name, 'rb')
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+        else:
+            start, end = byte_range
+            response = FileResponse(RangeReader(file, start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from . import routing
+
+'''
+Push notifications for request and comment changes, streamed to the dashboards as
+server-sent events by clearance.views.event_stream.
+
+Views call publish_requests() / publish_comment() and the compact event goes out
+once the transaction commits. Every channel is either a user (`user:<id>`), e.g.
+the student or a comment's sender and recipient, or the staff queue of a clearance type
+(`queue:<type id>` or `queue:<type id>:<department>` for department scoped
+types). Inside a process the Broker hands events to the open streams. The backend
+from the EVENT_STREAM setting carries them between processes: LocalBackend for a
+single process, RedisBackend (pub/sub) when several workers serve streams.
+'''
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per open stream, a client that falls this far behind is told to resync
+SUBSCRIPTION_BUFFER = 100
+RESYNC = json.dumps({'type': 'resync'})
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def queue_channel(clearance_type_id, department_key):
+    route = routing.route_for(clearance_type_id)
+    return f'queue:{clearance_type_id}:{department_key}' if route.department_scoped else f'queue:{clearance_type_id}'
+
+
+def user_channels(user):
+    """ Channels a user's stream listens on: their own, plus their clearance type's queue for staff. """
+    channels = [user_channel(user.id)]
+    if user.role == 'staff' and user.clearance_type_id:
+        channels.append(queue_channel(user.clearance_type_id, user.department_key))
+    return channels
+
+
+class Subscription:
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIPTION_BUFFER)
+
+    def deliver(self, message):
+        # Runs on the subscriber's event loop
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = RESYNC
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """ In-process fan-out from channels to the streams open in this process. """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        get_backend().start(self)
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in channels:
+                self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions[channel].discard(subscription)
+                if not self._subscriptions[channel]:
+                    del self._subscriptions[channel]
+
+    def dispatch(self, channel, message):
+        # Called from request threads or the backend's listener, never from the subscriber's loop
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # The loop was closed under a stream that is shutting down
+                subscription.close()
+
+
+broker = Broker()
+
+
+class LocalBackend:
+    """ Events stay in this process, enough for a single ASGI worker. """
+
+    def __init__(self, **options):
+        pass
+
+    def start(self, broker):
+        pass
+
+    def publish(self, channel, message):
+        broker.dispatch(channel, message)
+
+
+class RedisBackend:
+    """
+    Redis pub/sub between processes. Every process publishes to Redis and runs one
+    listener thread that dispatches what it receives to its own streams. `client` is
+    the dotted path of a callable returning a client, otherwise one is made from `url`.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', client=None, channel_prefix='clearance:events:'):
+        if client:
+            self.client = import_string(client)()
+        else:
+            try:
+                import redis
+            except ImportError:
+                raise ImproperlyConfigured('RedisBackend requires the redis package.')
+            self.client = redis.Redis.from_url(url)
+        self.channel_prefix = channel_prefix
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def start(self, broker):
+        with self._lock:
+            if self._listener is None:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.channel_prefix + '*')
+                self._listener = threading.Thread(
+                    target=self._listen, args=(pubsub, broker), name='event-stream-listener', daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self, pubsub, broker):
+        prefix = self.channel_prefix.encode()
+        for item in pubsub.listen():
+            channel, data = item['channel'], item['data']
+            if isinstance(channel, bytes) and channel.startswith(prefix):
+                broker.dispatch(channel[len(prefix):].decode(), data.decode())
+
+    def publish(self, channel, message):
+        self.client.publish(self.channel_prefix + channel, message)
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    config = getattr(settings, 'EVENT_STREAM', {})
+    backend = import_string(config.get('BACKEND', 'clearance.events.LocalBackend'))
+    return backend(**config.get('OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    if setting == 'EVENT_STREAM':
+        get_backend.cache_clear()
+
+
+def publish(events):
+    """ Send each (channel, event) pair once the current transaction commits. """
+    messages = [(channel, json.dumps(event, cls=DjangoJSONEncoder)) for channel, event in events]
+
+    def send():
+        backend = get_backend()
+        for channel, message in messages:
+            try:
+                backend.publish(channel, message)
+            except Exception:
+                # Streams are a convenience, polling still works if an event is lost
+                logger.exception('Publishing to %s failed', channel)
+
+    transaction.on_commit(send)
+
+
+def publish_requests(event_type, requests):
+    """
+    request.created / request.updated for (request, student department key) pairs,
+    sent to the student and the clearance type queue. Assigned staff are always
+    eligible for the request's route, so their streams get it through the queue.
+    Each channel gets one event listing its requests, so a bulk decision is one
+    event for the queue rather than one per request.
+    """
+    by_channel = defaultdict(list)
+    for clearance_request, department_key in requests:
+        delta = {
+            'id': clearance_request.id,
+            'status': clearance_request.status,
+            'version': clearance_request.version,
+            'clearance_type_id': clearance_request.clearance_type_id,
+            'student_id': clearance_request.student_id,
+            'assigned_staff_id': clearance_request.assigned_staff_id,
+        }
+        by_channel[user_channel(clearance_request.student_id)].append(delta)
+        by_channel[queue_channel(clearance_request.clearance_type_id, department_key)].append(delta)
+    publish((channel, {'type': event_type, 'requests': deltas}) for channel, deltas in by_channel.items())
+
+
+def publish_comment(comment):
+    event = {
+        'type': 'comment.created',
+        'comment': {
+            'id': comment.id,
+            'request_id': comment.request_id,
+            'sender_id': comment.sender_id,
+            'recipient_id': comment.recipient_id,
+            'timestamp': comment.timestamp,
+        },
+    }
+    publish((user_channel(user_id), event) for user_id in {comment.sender_id, comment.recipient_id})
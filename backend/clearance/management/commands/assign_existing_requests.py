@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from clearance import assignment, routing
+from clearance.models import Report, Request
+
+
+class Command(BaseCommand):
+    help = (
+        'Assign requests submitted before staff assignment existed, so they stay in a staff queue. '
+        'Decided requests go to the staff member who decided them, pending ones to an eligible staff member.'
+    )
+
+    def handle(self, *args, **options):
+        assigned = skipped = 0
+        unassigned = Request.objects.filter(assigned_staff__isnull=True).select_related('student').order_by('id')
+        for clearance_request in unassigned.iterator():
+            decided_by = None
+            if clearance_request.status != 'pending':
+                decided_by = Report.objects.filter(request=clearance_request).values_list('staff_id', flat=True).first()
+
+            if decided_by is not None:
+                clearance_request.assigned_staff_id = decided_by
+            else:
+                route = routing.route_for(clearance_request.clearance_type_id)
+                staff = assignment.pick_staff(route, clearance_request.student.department_key)
+                if staff is None:
+                    skipped += 1
+                    continue
+                clearance_request.assigned_staff = staff
+            clearance_request.save(update_fields=['assigned_staff', 'updated_at'])
+            assigned += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Assigned {assigned} requests, {skipped} had no eligible staff.'))
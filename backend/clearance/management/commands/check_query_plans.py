@@ -0,0 +1,68 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from accounts.models import User
+from clearance.models import Request
+
+
+def hot_queries():
+    ''' The request/user filters the clearance views run on every call '''
+    return {
+        'duplicate submission check': Request.objects.filter(student_id=1, clearance_type_id=1),
+        'student pending requests': Request.objects.filter(student_id=1, status='pending'),
+        'staff stats': Request.objects.filter(clearance_type_id=1, status='approved'),
+        'department scoped queue': Request.objects.filter(clearance_type_id=1, student__department_key='computer science'),
+        'eligible staff': User.objects.filter(role='staff', clearance_type_id=1, department_key='computer science'),
+    }
+
+
+def full_scans(queryset):
+    """
+    Return the tables the database plans to read with a full scan.
+    Only MySQL/MariaDB and SQLite plans are understood.
+    """
+    if connection.vendor == 'mysql':
+        plan = json.loads(queryset.explain(format='json'))
+        scans = []
+
+        def walk(node):
+            if isinstance(node, dict):
+                if node.get('access_type') == 'ALL':
+                    scans.append(node.get('table_name'))
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+
+        walk(plan)
+        return scans
+
+    if connection.vendor == 'sqlite':
+        # "SCAN <table>" without an index is a full table scan, "SEARCH" uses an index
+        return [
+            line.split('SCAN ', 1)[1].split()[0]
+            for line in queryset.explain().splitlines()
+            if 'SCAN ' in line and 'USING' not in line
+        ]
+
+    raise CommandError(f'Query plans for the {connection.vendor} backend are not supported.')
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot clearance queries and fail if any of them falls back to a full table scan.'
+
+    def handle(self, *args, **options):
+        failures = []
+        for name, queryset in hot_queries().items():
+            scans = full_scans(queryset)
+            if scans:
+                failures.append(f"{name}: full scan of {', '.join(scans)}")
+            else:
+                self.stdout.write(f'{name}: ok')
+
+        if failures:
+            raise CommandError('Full table scans found:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('All hot queries use an index.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from clearance import previews
+from clearance.models import DocumentPreview, Request
+
+
+class Command(BaseCommand):
+    help = 'Generate previews for documents that have none, or are still pending after a restart.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry previews that failed.')
+
+    def handle(self, *args, **options):
+        statuses = ['pending', 'failed'] if options['retry_failed'] else ['pending']
+        missing = Request.objects.exclude(file='').filter(
+            Q(preview__isnull=True) | Q(preview__status__in=statuses)
+        ).values_list('pk', flat=True)
+
+        generated = 0
+        for request_id in missing.iterator():
+            # Inline rather than through project.tasks, so the command finishes when the work does
+            DocumentPreview.objects.update_or_create(request_id=request_id, defaults={'status': 'pending', 'error': ''})
+            previews.generate(request_id)
+            generated += 1
+        self.stdout.write(self.style.SUCCESS(f'Generated {generated} document previews.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from clearance import uploads
+from clearance.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Delete expired resumable uploads and the chunks they left in the media storage.'
+
+    def handle(self, *args, **options):
+        expired = UploadSession.objects.filter(expires_at__lte=timezone.now())
+        deleted = 0
+        for session in expired.iterator():
+            uploads.delete_chunks(session)
+            session.delete()
+            deleted += 1
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired uploads.'))
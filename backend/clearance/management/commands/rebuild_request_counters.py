@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from clearance import counters
+from clearance.models import RequestCounter
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized request counters used by the staff stats banner.'
+
+    def handle(self, *args, **options):
+        counters.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {RequestCounter.objects.count()} request counters.'))
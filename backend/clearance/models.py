@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 from accounts.models import *
@@ -7,6 +9,9 @@ class Request(models.Model):
     clearance_type = models.ForeignKey(ClearanceType, on_delete=models.CASCADE)
     file = models.FileField(upload_to='documents/')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Anything a dashboard shows changed: status, report, comments or preview. Conditional and bulk
+    # UPDATEs bypass auto_now, so those paths set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
     
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -14,11 +19,82 @@ class Request(models.Model):
         ('rejected', 'Rejected'),
     ]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Staff member picked by clearance.assignment when the request was submitted
+    assigned_staff = models.ForeignKey(User, related_name='assigned_requests', on_delete=models.SET_NULL, blank=True, null=True)
+    # Bumped on every decision, decisions are conditional UPDATEs on the version the staff member saw
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # per-staff queues and outstanding-work counts
+            models.Index(fields=['assigned_staff', 'status'], name='request_staff_status_idx'),
+            # keyset pagination of a clearance type's queue, newest first on (created_at, id)
+            models.Index(fields=['clearance_type', 'created_at', 'id'], name='request_type_created_idx'),
+            # duplicate-submission checks in the submit views
+            models.Index(fields=['student', 'clearance_type'], name='request_student_type_idx'),
+            # a student's pending/history lists and stats
+            models.Index(fields=['student', 'status'], name='request_student_status_idx'),
+            # staff stats per clearance type
+            models.Index(fields=['clearance_type', 'status'], name='request_type_status_idx'),
+            # change token of the staff dashboard, latest modification within a clearance type
+            models.Index(fields=['clearance_type', 'updated_at'], name='request_type_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.clearance_type} ({self.status})"
 
 
+# Index of stored documents by content hash, identical uploads share one file (see clearance.documents)
+class DocumentBlob(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='documents/')
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.file.name
+
+
+# Resumable upload of a clearance document. Chunks are stored as uploads/<id>/<offset>
+# by clearance.uploads until the upload is completed into a Request.
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    student = models.ForeignKey(User, related_name='upload_sessions', on_delete=models.CASCADE)
+    clearance_type = models.ForeignKey(ClearanceType, on_delete=models.CASCADE)
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    # Set once completed, so a retried completion returns the same request
+    request = models.OneToOneField(Request, related_name='upload_session', on_delete=models.SET_NULL, blank=True, null=True)
+
+    @property
+    def chunk_dir(self):
+        return f'uploads/{self.id}'
+
+    def __str__(self):
+        return f"Upload {self.id} by {self.student_id} ({self.size} bytes)"
+
+
+# Thumbnail and extracted metadata of a request's document, filled in the background by clearance.previews
+class DocumentPreview(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    request = models.OneToOneField(Request, related_name='preview', on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    thumbnail = models.ImageField(upload_to='previews/', blank=True, null=True)
+    page_count = models.PositiveIntegerField(blank=True, null=True)
+    text = models.TextField(blank=True, default='')
+    error = models.CharField(max_length=255, blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Preview of request {self.request_id} ({self.status})"
+
+
 class Comment(models.Model):
     request = models.ForeignKey(Request, on_delete=models.CASCADE) # so that it's specific to the request
     sender = models.ForeignKey(User, related_name='sent_comments', on_delete=models.CASCADE)
@@ -27,6 +103,14 @@ class Comment(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Unread counts per recipient are answered from the index alone
+            models.Index(fields=['recipient', 'is_read'], name='comment_recipient_read_idx'),
+            # A request's thread in keyset order, and its comment count
+            models.Index(fields=['request', 'timestamp', 'id'], name='comment_request_ts_idx'),
+        ]
+
     def __str__(self):
         return f"From {self.sender} to {self.recipient}: {self.content[:20]}"
 
@@ -46,4 +130,21 @@ class Report(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.request} - {self.status}"
\ No newline at end of file
+        return f"{self.request} - {self.status}"
+
+
+# Materialized request counts per (clearance type, student department key, status), kept up
+# to date by clearance.counters so the stats banner doesn't have to COUNT the request table
+class RequestCounter(models.Model):
+    clearance_type = models.ForeignKey(ClearanceType, on_delete=models.CASCADE)
+    department = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=Request.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['clearance_type', 'department', 'status'], name='unique_request_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.clearance_type} / {self.department} / {self.status}: {self.count}"
@@ -0,0 +1,130 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+''' Keyset (cursor) pagination for the list endpoints '''
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def wants_pagination(request):
+    # Paging is opt-in so existing clients keep receiving a plain JSON array
+    params = request.query_params
+    return 'cursor' in params or 'page_size' in params
+
+
+def get_page_size(request):
+    try:
+        page_size = int(request.query_params.get('page_size', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise InvalidCursor('page_size must be a number.')
+    if page_size < 1:
+        raise InvalidCursor('page_size must be at least 1.')
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError):
+        raise InvalidCursor('Invalid cursor.')
+    if not isinstance(values, list):
+        raise InvalidCursor('Invalid cursor.')
+    return values
+
+
+def get_cursor(request):
+    cursor = request.query_params.get('cursor')
+    return decode_cursor(cursor) if cursor else None
+
+
+########################################### REQUESTS #############################################
+
+# Requests are listed newest first on (created_at, id)
+def request_keyset_filter(queryset, cursor):
+    if not cursor:
+        return queryset
+    try:
+        created_at, pk = cursor
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        raise InvalidCursor('Invalid cursor.')
+    if created_at is None:
+        raise InvalidCursor('Invalid cursor.')
+    return queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+
+def request_cursor(obj):
+    return encode_cursor([obj.created_at.isoformat(), obj.id])
+
+
+def paginate_requests(request, queryset):
+    """
+    Return (rows, next_cursor) for one page of a request queryset already
+    ordered by ('-created_at', '-id').
+    """
+    page_size = get_page_size(request)
+    rows = list(request_keyset_filter(queryset, get_cursor(request))[:page_size + 1])
+    next_cursor = request_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+########################################### STUDENTS #############################################
+
+# Students are listed by enrollment number (User.username for activated accounts)
+def student_keyset_value(request):
+    cursor = get_cursor(request)
+    if not cursor:
+        return None
+    if len(cursor) != 1 or not isinstance(cursor[0], str):
+        raise InvalidCursor('Invalid cursor.')
+    return cursor[0]
+
+
+def student_cursor(enrollment_number):
+    return encode_cursor([enrollment_number])
+
+
+########################################### COMMENTS #############################################
+
+# A request's comments are listed oldest first on (timestamp, id)
+def comment_keyset_filter(queryset, cursor):
+    if not cursor:
+        return queryset
+    try:
+        timestamp, pk = cursor
+        timestamp = parse_datetime(timestamp)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        raise InvalidCursor('Invalid cursor.')
+    if timestamp is None:
+        raise InvalidCursor('Invalid cursor.')
+    return queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+
+
+def paginate_comments(request, queryset):
+    """
+    Return (rows, next_cursor) for one page of a comment queryset already
+    ordered by ('timestamp', 'id').
+    """
+    page_size = get_page_size(request)
+    rows = list(comment_keyset_filter(queryset, get_cursor(request))[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        last = rows[page_size - 1]
+        next_cursor = encode_cursor([last.timestamp.isoformat(), last.id])
+    return rows[:page_size], next_cursor
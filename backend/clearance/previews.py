@@ -0,0 +1,133 @@
+import io
+import logging
+import mimetypes
+import os
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image
+
+from project import tasks
+from .models import DocumentPreview, Request
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+'''
+Background previews of submitted documents: a first-page thumbnail, the page count
+and the extracted text, stored in DocumentPreview so list views can show a small
+image instead of the document itself.
+
+PDFs are rendered with pypdfium2 (in requirements.txt), or PyMuPDF where that is
+installed instead; without either, PDF previews are marked failed. Images only need Pillow.
+'''
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_BOX = (THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 3 // 2)
+# Extracted text kept per document, enough for search and triage
+TEXT_MAX_CHARS = 20000
+
+
+def schedule(clearance_request):
+    """ (Re)build the preview of a request in the background once the current transaction commits. """
+    DocumentPreview.objects.update_or_create(
+        request=clearance_request, defaults={'status': 'pending', 'error': ''}
+    )
+    tasks.run(generate, clearance_request.pk)
+
+
+def _source(field_file):
+    # Local storages give renderers a path to read lazily, others get an open file
+    try:
+        return field_file.path
+    except NotImplementedError:
+        return field_file.open('rb')
+
+
+def _render_pdf(field_file):
+    source = _source(field_file)
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(source)
+        try:
+            first = pdf[0]
+            image = first.render(scale=THUMBNAIL_WIDTH / first.get_width()).to_pil()
+            text = []
+            for page in pdf:
+                text.append(page.get_textpage().get_text_range())
+                if sum(map(len, text)) >= TEXT_MAX_CHARS:
+                    break
+            return image, len(pdf), '\n'.join(text)
+        finally:
+            pdf.close()
+
+    if fitz is not None:
+        pdf = fitz.open(source) if isinstance(source, str) else fitz.open(stream=source.read(), filetype='pdf')
+        try:
+            first = pdf[0]
+            zoom = THUMBNAIL_WIDTH / first.rect.width
+            pixmap = first.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+            text = []
+            for page in pdf:
+                text.append(page.get_text())
+                if sum(map(len, text)) >= TEXT_MAX_CHARS:
+                    break
+            return image, pdf.page_count, '\n'.join(text)
+        finally:
+            pdf.close()
+
+    raise RuntimeError('No PDF renderer installed (pypdfium2 or PyMuPDF).')
+
+
+def _render_image(field_file):
+    with field_file.open('rb') as f:
+        image = Image.open(f)
+        image.load()
+    return image, 1, ''
+
+
+def _thumbnail_bytes(image):
+    image = image.convert('RGB')
+    image.thumbnail(THUMBNAIL_BOX)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=80, optimize=True)
+    return buffer.getvalue()
+
+
+def generate(request_id):
+    preview = DocumentPreview.objects.select_related('request').filter(request_id=request_id).first()
+    if preview is None:
+        return
+    document = preview.request.file
+
+    try:
+        # Documents are content addressed, an identical one may already have a preview
+        existing = (
+            DocumentPreview.objects.filter(request__file=document.name, status='ready')
+            .exclude(pk=preview.pk).first()
+        )
+        if existing is not None:
+            preview.thumbnail = existing.thumbnail.name
+            preview.page_count, preview.text = existing.page_count, existing.text
+        else:
+            content_type = mimetypes.guess_type(document.name)[0]
+            render = _render_pdf if content_type == 'application/pdf' else _render_image
+            image, preview.page_count, text = render(document)
+            preview.text = text[:TEXT_MAX_CHARS]
+            name = os.path.splitext(os.path.basename(document.name))[0] + '.jpg'
+            preview.thumbnail.save(name, ContentFile(_thumbnail_bytes(image)), save=False)
+        preview.status, preview.error = 'ready', ''
+    except Exception as e:
+        logger.warning('Preview of request %s failed: %s', request_id, e)
+        preview.status, preview.error = 'failed', str(e)[:255]
+    preview.save()
+    Request.objects.filter(pk=request_id).update(updated_at=timezone.now())
@@ -0,0 +1,154 @@
+import heapq
+from operator import itemgetter
+
+from django.db import connection, models
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce
+
+from accounts.mixins import split_fields
+from accounts.models import User, ValidStudent, normalize_department
+from .models import Comment, Request
+
+''' Shared queryset builders for the list endpoints '''
+
+# Every relation RequestSerializer reads: the nested student, the reverse OneToOne report
+# with its staff and the document preview. Clearance types come from the in-memory
+# registry instead of a join.
+REQUEST_LIST_RELATED = ('student', 'report', 'report__staff', 'preview')
+
+# Serializer fields that need each relation, used to skip joins a projection doesn't render
+RELATED_FIELDS = {
+    'student': {'student'},
+    'report': {'report'},
+    'report__staff': {'report'},
+    'preview': {'preview'},
+}
+
+
+def _comment_count(comments):
+    # Correlated COUNT per row, answered from comment_request_ts_idx without a GROUP BY over the joins
+    counts = comments.filter(request=OuterRef('pk')).order_by().values('request').annotate(n=Count('id')).values('n')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+def request_list_queryset(queryset=None, fields=None, user=None):
+    """
+    Return a Request queryset that RequestSerializer can render in a constant
+    number of queries, no matter how many rows it contains.
+    Pass the ?fields= projection to only join the relations it renders, and the
+    current user to annotate how many of each request's comments they haven't read.
+    """
+    if queryset is None:
+        queryset = Request.objects.all()
+
+    related = REQUEST_LIST_RELATED
+    top_level = None
+    if fields is not None:
+        top_level, _ = split_fields(fields)
+        related = [name for name in REQUEST_LIST_RELATED if RELATED_FIELDS[name] & top_level]
+
+    if related:
+        queryset = queryset.select_related(*related)
+    if top_level is None or 'comment_count' in top_level:
+        queryset = queryset.annotate(comment_count=_comment_count(Comment.objects.all()))
+    if user is not None and (top_level is None or 'unread_comment_count' in top_level):
+        queryset = queryset.annotate(
+            unread_comment_count=_comment_count(Comment.objects.filter(recipient_id=user.id, is_read=False))
+        )
+    return queryset.order_by('-created_at', '-id')
+
+
+STUDENT_ROW_COLUMNS = (
+    'row_key', 'row_user_id', 'row_first_name', 'row_last_name', 'row_full_name', 'row_email',
+    'row_department', 'row_avatar', 'row_avatar_variants', 'row_phone', 'row_is_active', 'row_course', 'row_gpa',
+    'row_credits', 'row_admission_date', 'row_expected_graduation', 'row_year', 'row_semester',
+    'row_bio', 'row_clearance_type', 'row_position',
+)
+
+
+def _student_columns(**columns):
+    # Union members must select the same columns in the same order, so every
+    # column is an annotation with a name that doesn't clash with a model field
+    return {name: columns[name] for name in STUDENT_ROW_COLUMNS}
+
+
+def assigned_students_queryset(department=None, after=None, limit=None):
+    """
+    One query returning activated students (User) and not-yet-activated ones
+    (ValidStudent) as values() rows ordered by enrollment number.
+    ValidStudents that already have an account are removed with an anti-join,
+    and only `limit` rows after the `after` enrollment number are fetched. On
+    SQLite a limited page is two queries merged here, returned as a list.
+    """
+    users = User.objects.filter(role='student')
+    valid_students = ValidStudent.objects.filter(status='active').exclude(
+        enrollment_number__in=User.objects.filter(role='student').values('username')
+    )
+    if department is not None:
+        department_key = normalize_department(department)
+        users = users.filter(department_key=department_key)
+        valid_students = valid_students.filter(department_key=department_key)
+    if after is not None:
+        users = users.filter(username__gt=after)
+        valid_students = valid_students.filter(enrollment_number__gt=after)
+
+    text = models.CharField()
+    users = users.annotate(**_student_columns(
+        row_key=F('username'),
+        row_user_id=F('id'),
+        row_first_name=F('first_name'),
+        row_last_name=F('last_name'),
+        row_full_name=Value('', output_field=text),
+        row_email=F('email'),
+        row_department=F('department'),
+        row_avatar=F('avatar'),
+        row_avatar_variants=F('avatar_variants'),
+        row_phone=F('phone'),
+        row_is_active=F('is_active'),
+        row_course=F('course'),
+        row_gpa=F('gpa'),
+        row_credits=F('credits'),
+        row_admission_date=F('admission_date'),
+        row_expected_graduation=F('expected_graduation'),
+        row_year=F('year'),
+        row_semester=F('semester'),
+        row_bio=F('bio'),
+        row_clearance_type=F('clearance_type_id'),
+        row_position=F('position'),
+    )).values(*STUDENT_ROW_COLUMNS)
+
+    valid_students = valid_students.annotate(**_student_columns(
+        row_key=F('enrollment_number'),
+        row_user_id=Value(None, output_field=models.BigIntegerField()),
+        row_first_name=Value('', output_field=text),
+        row_last_name=Value('', output_field=text),
+        row_full_name=F('name'),
+        row_email=F('university_email'),
+        row_department=F('department'),
+        row_avatar=F('avatar'),
+        row_avatar_variants=F('avatar_variants'),
+        row_phone=F('phone'),
+        row_is_active=Value(False, output_field=models.BooleanField()),
+        row_course=F('course'),
+        row_gpa=F('gpa'),
+        row_credits=F('credits'),
+        row_admission_date=F('admission_date'),
+        row_expected_graduation=F('expected_graduation'),
+        row_year=F('year'),
+        row_semester=Cast('semester', output_field=text),
+        row_bio=F('bio'),
+        row_clearance_type=Value(None, output_field=models.BigIntegerField()),
+        row_position=Value(None, output_field=text),
+    )).values(*STUDENT_ROW_COLUMNS)
+
+    if limit is None:
+        return users.union(valid_students, all=True).order_by('row_key')
+
+    # Each source reads at most `limit` rows after the cursor, so a page costs the same wherever it starts
+    users = users.order_by('row_key')[:limit]
+    valid_students = valid_students.order_by('row_key')[:limit]
+    if connection.features.supports_slicing_ordering_in_compound:
+        # (SELECT ... ORDER BY row_key LIMIT n) UNION ALL (SELECT ... LIMIT n) ORDER BY row_key LIMIT n
+        return users.union(valid_students, all=True).order_by('row_key')[:limit]
+    # SQLite can't order or limit the members of a compound statement, merge the two limited queries
+    return list(heapq.merge(users, valid_students, key=itemgetter('row_key')))[:limit]
@@ -0,0 +1,87 @@
+from dataclasses import dataclass
+
+from django.db.models import Q
+
+from accounts import clearance_types
+
+'''
+Data-driven clearance routing.
+
+Routing scope, priority and the eligible staff role are columns on ClearanceType.
+They are compiled once per clearance type registry snapshot into Route objects,
+so views never special-case clearance type names.
+'''
+
+@dataclass(frozen=True)
+class Route:
+    clearance_type_id: int
+    name: str
+    department_scoped: bool
+    priority: str
+    staff_role: str
+
+    def staff_filter(self, department_key):
+        # Active staff eligible to handle a request from a student of this department
+        condition = Q(role=self.staff_role, clearance_type_id=self.clearance_type_id, is_active=True)
+        if self.department_scoped:
+            condition &= Q(department_key=department_key)
+        return condition
+
+    def request_filter(self, staff):
+        # Requests of this type that a staff member may see
+        condition = Q(clearance_type_id=self.clearance_type_id)
+        if self.department_scoped:
+            condition &= Q(student__department_key=staff.department_key)
+        return condition
+
+    def student_department(self, staff):
+        # Department whose students this staff member handles, None for university-wide types
+        return staff.department if self.department_scoped else None
+
+    def covers(self, staff, student_department_key):
+        # Whether a staff member may decide on a request from a student of this department
+        if staff.clearance_type_id != self.clearance_type_id:
+            return False
+        return not self.department_scoped or student_department_key == staff.department_key
+
+
+# (registry snapshot, routes by id, routes by lowercase name), replaced in one assignment
+_compiled = (None, {}, {})
+
+
+def _routes():
+    global _compiled
+    snapshot = clearance_types.snapshot()
+    compiled = _compiled
+    if compiled[0] is snapshot:
+        return compiled
+
+    by_id = {
+        ct.id: Route(
+            clearance_type_id=ct.id,
+            name=ct.clearance_type.lower(),
+            department_scoped=ct.department_scoped,
+            priority=ct.priority,
+            staff_role=ct.staff_role,
+        )
+        for ct in snapshot.by_id.values()
+    }
+    compiled = (snapshot, by_id, {route.name: route for route in by_id.values()})
+    _compiled = compiled
+    return compiled
+
+
+def route_for(clearance_type_id):
+    """ Route for a clearance type id, raises ClearanceType.DoesNotExist for unknown ids. """
+    route = _routes()[1].get(clearance_type_id)
+    if route is None:
+        # Normalizes ids given as strings and raises the registry's DoesNotExist
+        route = _routes()[1][clearance_types.get_by_id(clearance_type_id).id]
+    return route
+
+
+def route_by_name(name):
+    route = _routes()[2].get(name.lower()) if name else None
+    if route is None:
+        route = _routes()[1][clearance_types.get_by_name(name).id]
+    return route
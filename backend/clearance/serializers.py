@@ -1,15 +1,17 @@
 from rest_framework import serializers
 from .models import Request, Comment, Report
 from accounts.serializers import *
+from accounts import avatars, clearance_types
+from . import downloads, routing
 
 # Serializer for request status/decision by staff
-class ReportSerializer(serializers.ModelSerializer):
+class ReportSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     staff_name = serializers.CharField(source='staff.get_full_name', read_only=True)
     staff_email = serializers.EmailField(source='staff.email', read_only=True)
     request_id = serializers.PrimaryKeyRelatedField(source='request', read_only=True)
     remarks = serializers.CharField(read_only=True)
     timestamp = serializers.DateTimeField(format="%Y-%m-%d %H:%M", read_only=True)
-    document = serializers.FileField(read_only=True)
+    document = serializers.SerializerMethodField()
 
     class Meta:
         model = Report
@@ -34,16 +36,23 @@ class ReportSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Only staff can submit or update reports.")
         return data
 
+    def get_document(self, obj):
+        request = self.context.get('request')
+        return downloads.document_url(request, obj.request, kind='report') if obj.document and request else None
+
 # Serializer for submitting/viewing a clearance request
-class RequestSerializer(serializers.ModelSerializer):
+class RequestSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     student = UserSerializer(read_only=True)
     clearance_type = serializers.CharField(source='clearance_type_id.clearance_type', read_only=True)
-    file = serializers.FileField(required=True)
+    file = serializers.SerializerMethodField()
     type = serializers.SerializerMethodField()
     priority = serializers.SerializerMethodField()
     date = serializers.SerializerMethodField()
     comments = serializers.SerializerMethodField()
+    comment_count = serializers.SerializerMethodField()
+    unread_comment_count = serializers.SerializerMethodField()
     documents = serializers.SerializerMethodField()
+    preview = serializers.SerializerMethodField()
     report = ReportSerializer(read_only=True)
 
     class Meta:
@@ -56,37 +65,68 @@ class RequestSerializer(serializers.ModelSerializer):
             'type',
             'file',
             'documents',
+            'preview',
             'date',
             'priority',
             'created_at',
             'status',
+            'assigned_staff',
+            'version',
             'comments',
+            'comment_count',
+            'unread_comment_count',
             'report'
         ]
-        read_only_fields = ['id', 'created_at', 'status', 'clearance_type', 'type', 'priority', 'date', 'documents', 'comments']
+        read_only_fields = ['id', 'created_at', 'status', 'assigned_staff', 'version', 'clearance_type', 'type', 'priority', 'date', 'documents', 'preview', 'comments', 'comment_count', 'unread_comment_count']
 
     def get_type(self, obj):
-        return obj.clearance_type.clearance_type
+        return clearance_types.get_by_id(obj.clearance_type_id).clearance_type
 
     def get_date(self, obj):
         return obj.created_at.strftime('%Y-%m-%d')
 
     def get_priority(self, obj):
-        clearance_type = obj.clearance_type.clearance_type.lower()
-
-        if clearance_type == 'project':
-            return 'high'
-        elif clearance_type == 'lab' or clearance_type == 'library':
-            return 'medium'
-        return 'low'
+        return routing.route_for(obj.clearance_type_id).priority
 
 
     def get_comments(self, obj):
+        # Threads are paged through requests/<id>/comments/, lists only carry the counts
         return []
 
+    def get_comment_count(self, obj):
+        # Annotated by clearance.queries.request_list_queryset(), counted here for single requests
+        count = getattr(obj, 'comment_count', None)
+        return obj.comment_set.count() if count is None else count
+
+    def get_unread_comment_count(self, obj):
+        count = getattr(obj, 'unread_comment_count', None)
+        if count is not None:
+            return count
+        request = self.context.get('request')
+        if request is None:
+            return None
+        return obj.comment_set.filter(recipient_id=request.user.id, is_read=False).count()
+
+    def get_file(self, obj):
+        # Media files aren't served publicly, hand out a signed link to the download view
+        request = self.context.get('request')
+        return downloads.document_url(request, obj) if obj.file and request else None
+
     def get_documents(self, obj):
         return [obj.file.name] if obj.file else []
 
+    def get_preview(self, obj):
+        # Filled in the background after submission, see clearance.previews
+        preview = getattr(obj, 'preview', None)
+        if preview is None:
+            return None
+        request = self.context.get('request')
+        return {
+            'status': preview.status,
+            'page_count': preview.page_count,
+            'thumbnail': downloads.document_url(request, obj, kind='preview') if preview.thumbnail and request else None,
+        }
+
     def validate(self, data):
         request = self.context.get('request')
         user = request.user if request else None
@@ -104,4 +144,57 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ['id', 'sender', 'sender_name', 'recipient', 'recipient_name', 'content', 'timestamp', 'is_read']
-        read_only_fields = ['id', 'timestamp', 'sender_name', 'recipient_name', 'is_read']
\ No newline at end of file
+        # Sender and recipient follow from the request and the poster, see CommentListView
+        read_only_fields = ['id', 'sender', 'recipient', 'timestamp', 'sender_name', 'recipient_name', 'is_read']
+
+
+# Lightweight serializer for assigned-students rows from clearance.queries.assigned_students_queryset()
+class StudentRowSerializer(serializers.BaseSerializer):
+    def __init__(self, *args, **kwargs):
+        self.only = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+    def to_representation(self, row):
+        request = self.context.get('request')
+
+        # ValidStudent rows carry the full name, activated users carry first/last names
+        if row['row_full_name']:
+            first_name, _, last_name = row['row_full_name'].strip().partition(' ')
+            last_name = ' '.join(last_name.split())
+        else:
+            first_name, last_name = row['row_first_name'], row['row_last_name']
+        name = f"{first_name} {last_name}".strip()
+
+        # Thumbnail-sized by default, a roster can have thousands of rows
+        avatar = avatars.avatar_url(
+            request, row['row_avatar'], row['row_avatar_variants'], avatars.requested_size(request, 'small')
+        )
+
+        data = {
+            'id': row['row_user_id'],
+            'username': row['row_key'],
+            'id_number': row['row_key'],
+            'studentId': row['row_key'],
+            'first_name': first_name,
+            'last_name': last_name,
+            'name': name,
+            'email': row['row_email'],
+            'role': 'student',
+            'department': row['row_department'],
+            'clearance_type': row['row_clearance_type'],
+            'is_active': bool(row['row_is_active']),
+            'phone': row['row_phone'],
+            'avatar': avatar,
+            'bio': row['row_bio'],
+            'course': row['row_course'],
+            'year': row['row_year'],
+            'semester': row['row_semester'],
+            'admission_date': row['row_admission_date'],
+            'expected_graduation': row['row_expected_graduation'],
+            'gpa': str(row['row_gpa']) if row['row_gpa'] is not None else None,
+            'credits': row['row_credits'],
+            'position': row['row_position'],
+        }
+        if self.only is not None:
+            data = {key: value for key, value in data.items() if key in self.only}
+        return data
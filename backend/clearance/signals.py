@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import counters
+from .models import Request
+
+''' Keeps the request counters in step with Request saves and deletes '''
+
+@receiver(post_init, sender=Request)
+def remember_status(sender, instance, **kwargs):
+    # Status as last loaded/saved, so post_save can tell what changed. Read through
+    # __dict__ so a deferred status field isn't fetched for every loaded row
+    instance._counted_status = instance.__dict__.get('status') if instance.pk else None
+
+
+@receiver(post_save, sender=Request)
+def count_saved_request(sender, instance, created, **kwargs):
+    old_status = None if created else instance._counted_status
+    if counters.counters_enabled() and old_status != instance.status:
+        counters.record_transition(
+            instance.clearance_type_id, instance.student.department_key, old_status, instance.status
+        )
+    instance._counted_status = instance.status
+
+
+@receiver(post_delete, sender=Request)
+def count_deleted_request(sender, instance, **kwargs):
+    if counters.counters_enabled():
+        counters.record_transition(
+            instance.clearance_type_id, instance.student.department_key, instance._counted_status, None
+        )
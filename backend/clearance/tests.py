@@ -1,3 +1,814 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import re
+import shutil
+import tempfile
+import threading
+from datetime import date
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, AsyncRequestFactory, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts import async_views as account_async_views
+from accounts.async_api import in_thread
+from accounts.models import ClearanceType, User, ValidStudent
+from accounts.tokens import ClearanceAccessToken
+from . import assignment, async_views, counters, documents, events, previews, routing
+from .management.commands.check_query_plans import full_scans, hot_queries
+from .models import Comment, DocumentBlob, DocumentPreview, Report, Request
+from .queries import assigned_students_queryset
+from .views import BulkUpdateRequestStatusView
+
+
+def make_user(username, role, department='Computer Science', clearance_type=None):
+    return User.objects.create(
+        username=username, role=role, department=department, clearance_type=clearance_type,
+        email=f'{username.lower()}@university.edu', first_name='First', last_name='Last',
+    )
+
+
+class ClearanceDataMixin:
+    """ A library staff member and a student, with add_rows() growing the lists they see. """
+
+    def setUp(self):
+        self.library = ClearanceType.objects.create(clearance_type='library', priority='medium')
+        self.staff = make_user('STF001', 'staff', clearance_type=self.library)
+        self.student = make_user('ENR000', 'student')
+        self.rows = 0
+
+    def add_rows(self, count):
+        # Requests with reports and comments, plus activated and roster-only students
+        for i in range(self.rows, self.rows + count):
+            applicant = make_user(f'ENR{i + 1:05d}', 'student')
+            ValidStudent.objects.create(
+                enrollment_number=f'VS{i:05d}', university_email=f'vs{i}@university.edu', name='Roster Student',
+                department='Computer Science', course='BSc', admission_date=date(2024, 9, 1), gpa='3.00',
+                credits='60', phone='0700000000',
+            )
+            for student in (self.student, applicant):
+                clearance_request = Request.objects.create(
+                    student=student, clearance_type=self.library, file='documents/form.pdf', assigned_staff=self.staff
+                )
+                Report.objects.create(request=clearance_request, staff=self.staff, remarks='Checked')
+                Comment.objects.create(
+                    request=clearance_request, sender=self.staff, recipient=student, content='Please sign.'
+                )
+        self.rows += count
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+class TempMediaMixin:
+    """ MEDIA_ROOT in a temporary directory, removed after the test. """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        super().setUp()
+
+
+class ListQueryCountTests(ClearanceDataMixin, TestCase):
+    """ List endpoints must cost the same number of queries however many rows they return. """
+
+    def assertFlatQueryCount(self, user, url, rows=5):
+        client = self.client_for(user)
+        self.add_rows(rows)
+        # Warm the process-local clearance type registry, reloaded after setUp created the type
+        client.get(url)
+        with CaptureQueriesContext(connection) as small:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        small_length = len(response.json())
+
+        self.add_rows(rows * 9)
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(response.json()), small_length)
+
+    def test_my_requests(self):
+        self.assertFlatQueryCount(self.student, reverse('my-requests'))
+
+    def test_assigned_requests(self):
+        self.assertFlatQueryCount(self.staff, reverse('assigned-requests'))
+
+    def test_assigned_students(self):
+        self.assertFlatQueryCount(self.staff, reverse('assigned-students') + f'?clearance_type={self.library.id}')
+
+
+class QueryPlanTests(TestCase):
+    """ The hot filters must stay on an index, see the check_query_plans command. """
+
+    def test_hot_queries_use_an_index(self):
+        call_command('check_query_plans', stdout=StringIO())
+
+    @skipUnless(connection.vendor == 'sqlite', 'plan text is SQLite specific')
+    def test_composite_indexes_are_chosen(self):
+        # Foreign key indexes alone would pass the full scan check, the composite ones must be picked
+        queries = hot_queries()
+        for name, index in (
+            ('duplicate submission check', 'request_student_type_idx'),
+            ('student pending requests', 'request_student_status_idx'),
+            ('staff stats', 'request_type_status_idx'),
+        ):
+            self.assertIn(f'USING INDEX {index} ', queries[name].explain(), name)
+
+    def test_unindexed_filter_is_reported(self):
+        self.assertEqual(full_scans(Request.objects.filter(file='documents/form.pdf')), ['clearance_request'])
+
+
+class AsyncViewParityTests(ClearanceDataMixin, TransactionTestCase):
+    """
+    The async read views must answer exactly like the APIViews they mirror. A
+    TransactionTestCase, since they query from worker threads with their own connections.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.add_rows(3)
+        ValidStudent.objects.create(
+            enrollment_number=self.student.username, university_email=self.student.email, name='First Last',
+            department='Computer Science', course='BSc', admission_date=date(2024, 9, 1), gpa='3.00',
+            credits='60', phone='0700000000',
+        )
+        # Leave one request pending so both the pending list and the history have rows
+        pending = Request.objects.filter(student=self.student).order_by('id').first()
+        Request.objects.filter(student=self.student).exclude(id=pending.id).update(status='approved')
+
+    def assertSameResponse(self, user, url, async_view):
+        authorization = f'Bearer {ClearanceAccessToken.for_user(user)}'
+
+        sync_response = APIClient().get(url, HTTP_AUTHORIZATION=authorization)
+        async_request = AsyncRequestFactory().get(url, headers={'Authorization': authorization})
+        async_response = async_to_sync(async_view)(async_request)
+
+        self.assertEqual(async_response.status_code, sync_response.status_code, url)
+        self.assertEqual(self.comparable(async_response), self.comparable(sync_response), url)
+
+    @staticmethod
+    def comparable(response):
+        # Signed document links carry a timestamp, only their target has to match
+        return json.loads(re.sub(r'\?token=[^"]*', '', response.content.decode()))
+
+    def test_student_views(self):
+        self.assertSameResponse(self.student, '/clearance/my-requests/', async_views.request_status)
+        self.assertSameResponse(self.student, '/clearance/student-stats/', async_views.student_clearance_stats)
+        self.assertSameResponse(self.student, '/clearance/student-history/', async_views.student_history)
+        self.assertSameResponse(self.student, '/accounts/user/me/', account_async_views.me)
+
+    def test_staff_views(self):
+        self.assertSameResponse(self.staff, '/clearance/assigned-requests/', async_views.assigned_requests)
+        self.assertSameResponse(
+            self.staff, '/clearance/assigned-requests/?page_size=2&fields=id,status', async_views.assigned_requests
+        )
+        self.assertSameResponse(self.staff, '/clearance/stats/', async_views.staff_clearance_stats)
+        self.assertSameResponse(self.staff, '/accounts/user/me/', account_async_views.me)
+
+    def test_error_responses(self):
+        self.assertSameResponse(self.student, '/clearance/assigned-requests/', async_views.assigned_requests)
+        self.assertSameResponse(self.student, '/clearance/stats/', async_views.staff_clearance_stats)
+        self.assertSameResponse(self.staff, '/clearance/my-requests/', async_views.request_status)
+        self.assertSameResponse(
+            self.staff, '/clearance/assigned-requests/?cursor=bad&page_size=2', async_views.assigned_requests
+        )
+
+    def test_in_thread_calls_overlap(self):
+        # Both calls must be waiting at once to pass the barrier, on one shared thread the first times out
+        barrier = threading.Barrier(2, timeout=5)
+
+        async def both():
+            await asyncio.gather(in_thread(barrier.wait), in_thread(barrier.wait))
+
+        async_to_sync(both)()
+
+    def test_concurrent_requests(self):
+        authorization = f'Bearer {ClearanceAccessToken.for_user(self.student)}'
+        expected = self.comparable(APIClient().get('/clearance/my-requests/', HTTP_AUTHORIZATION=authorization))
+        factory = AsyncRequestFactory()
+
+        async def burst():
+            return await asyncio.gather(*(
+                async_views.request_status(factory.get('/clearance/my-requests/', headers={'Authorization': authorization}))
+                for _ in range(20)
+            ))
+
+        responses = async_to_sync(burst)()
+
+        self.assertEqual({response.status_code for response in responses}, {200})
+        for response in responses:
+            self.assertEqual(self.comparable(response), expected)
+
+
+class DashboardETagTests(ClearanceDataMixin, TestCase):
+    def assertTypeEditChangesETag(self, user, url):
+        client = self.client_for(user)
+        etag = client.get(url)['ETag']
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.library.priority = 'high'
+        self.library.save()
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_student_dashboard_follows_clearance_type_edits(self):
+        self.add_rows(2)
+        self.assertTypeEditChangesETag(self.student, reverse('student-dashboard'))
+
+    def test_staff_dashboard_follows_clearance_type_edits(self):
+        self.add_rows(2)
+        self.assertTypeEditChangesETag(self.staff, reverse('staff-dashboard'))
+
+
+class DocumentAccessTests(TempMediaMixin, ClearanceDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Sees the request in the scope=all queue but is neither assigned nor deciding
+        self.other_staff = make_user('STF002', 'staff', clearance_type=self.library)
+        self.request = Request(student=self.student, clearance_type=self.library, assigned_staff=self.staff)
+        self.request.file.save('form.pdf', ContentFile(b'%PDF-1.4 form'))
+        self.url = reverse('request-document', args=[self.request.id])
+
+    def link_for(self, user):
+        # The link a list endpoint hands this user
+        url = reverse('assigned-requests') + '?scope=all' if user.role == 'staff' else reverse('my-requests')
+        response = self.client_for(user).get(url)
+        return next(item['file'] for item in response.json() if item['id'] == self.request.id)
+
+    def test_authenticated_access(self):
+        self.assertEqual(self.client_for(self.student).get(self.url).status_code, 200)
+        self.assertEqual(self.client_for(self.staff).get(self.url).status_code, 200)
+        self.assertEqual(self.client_for(self.other_staff).get(self.url).status_code, 403)
+
+    def test_signed_link_of_an_assigned_user(self):
+        response = APIClient().get(self.link_for(self.staff))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 form')
+
+    def test_signed_link_is_checked_against_its_user(self):
+        link = self.link_for(self.other_staff)
+        self.assertEqual(APIClient().get(link).status_code, 403)
+
+    def test_signed_link_of_a_deactivated_user(self):
+        link = self.link_for(self.student)
+        User.objects.filter(id=self.student.id).update(is_active=False)
+        self.assertEqual(APIClient().get(link).status_code, 403)
+
+    def test_missing_or_foreign_token(self):
+        self.assertEqual(APIClient().get(self.url).status_code, 401)
+        other = Request.objects.create(student=self.student, clearance_type=self.library, file='documents/x.pdf')
+        foreign_link = self.link_for(self.student).replace(f'/requests/{self.request.id}/', f'/requests/{other.id}/')
+        self.assertEqual(APIClient().get(foreign_link).status_code, 401)
+
+
+class AssignedStudentsPageTests(ClearanceDataMixin, TestCase):
+    """ A page of assigned students reads `limit` rows from each source, not everything after the cursor. """
+
+    def setUp(self):
+        super().setUp()
+        # ENR00001.. are activated, VS00000.. roster only
+        self.add_rows(6)
+
+    def test_page_merges_both_sources_in_order(self):
+        rows = list(assigned_students_queryset(after='ENR00003', limit=4))
+        self.assertEqual([row['row_key'] for row in rows], ['ENR00004', 'ENR00005', 'ENR00006', 'VS00000'])
+
+    def test_each_source_is_ordered_and_limited(self):
+        with CaptureQueriesContext(connection) as ctx:
+            list(assigned_students_queryset(limit=3))
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        for table in ('"accounts_user"', '"accounts_validstudent"'):
+            self.assertIn(table, sql)
+        self.assertGreaterEqual(sql.count('LIMIT 3'), 2, sql)
+
+    def test_compound_query_limits_every_member(self):
+        # Shape on backends that order and limit inside UNION members (MySQL, PostgreSQL)
+        with mock.patch.object(connection.features, 'supports_slicing_ordering_in_compound', True):
+            sql = str(assigned_students_queryset(limit=3).query)
+        self.assertRegex(
+            sql, r'^\(SELECT .+ ORDER BY .+ LIMIT 3\) UNION ALL \(SELECT .+ ORDER BY .+ LIMIT 3\) ORDER BY .+ LIMIT 3$'
+        )
+
+
+@override_settings(UPLOAD_CHUNK_MAX_SIZE=8)
+class UploadSessionTests(TempMediaMixin, ClearanceDataMixin, TestCase):
+    DOCUMENT = b'%PDF-1.4 resumable upload'
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.student)
+        response = self.client.post(
+            reverse('upload-session-create'), {'clearance_type': 'library', 'size': len(self.DOCUMENT)}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['chunk_size'], 8)
+        self.session_id = response.data['id']
+
+    def put(self, offset, end=None, data=None):
+        end = min(offset + 8, len(self.DOCUMENT)) if end is None else end
+        return self.client.put(
+            reverse('upload-session', args=[self.session_id]) + f'?offset={offset}',
+            self.DOCUMENT[offset:end] if data is None else data, content_type='application/octet-stream',
+        )
+
+    def complete(self):
+        return self.client.post(reverse('upload-session-complete', args=[self.session_id]))
+
+    def test_upload_resume_and_complete(self):
+        self.assertEqual(self.put(0).status_code, 200)
+        self.assertEqual(self.put(16).status_code, 200)
+
+        response = self.complete()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['missing'], [[8, 16], [24, 25]])
+
+        # Resume from the progress report
+        progress = self.client.get(reverse('upload-session', args=[self.session_id])).data
+        for start, _ in progress['missing']:
+            self.assertEqual(self.put(start).status_code, 200)
+
+        response = self.complete()
+        self.assertEqual(response.status_code, 201)
+        clearance_request = Request.objects.get(id=response.data['request']['id'])
+        with clearance_request.file.open('rb') as document:
+            self.assertEqual(document.read(), self.DOCUMENT)
+        # A retried completion returns the same request
+        self.assertEqual(self.complete().data['request']['id'], clearance_request.id)
+
+    def test_short_chunk_is_resumed_from_the_missing_range(self):
+        self.assertEqual(self.put(0, 5).status_code, 200)
+        self.assertEqual(self.put(5, 8).status_code, 200)
+        self.assertEqual(self.put(8).status_code, 200)
+
+    def test_misaligned_offsets_are_rejected(self):
+        self.assertEqual(self.put(0).status_code, 200)
+        # Overlapping a received chunk, and starting inside a missing range
+        self.assertEqual(self.put(3).status_code, 416)
+        self.assertEqual(self.put(10).status_code, 416)
+        # At the start of a missing range but running past it into a received chunk
+        self.assertEqual(self.put(8).status_code, 200)
+        self.assertEqual(self.put(0, 5).status_code, 200)
+        self.assertEqual(self.put(5, 12).status_code, 416)
+        # Outside the document
+        self.assertEqual(self.put(24, data=b'ab').status_code, 416)
+
+
+class DocumentPreviewTests(TempMediaMixin, ClearanceDataMixin, TestCase):
+    def preview_of(self, name, content):
+        clearance_request = Request(student=self.student, clearance_type=self.library)
+        clearance_request.file.save(name, ContentFile(content))
+        DocumentPreview.objects.create(request=clearance_request)
+        previews.generate(clearance_request.id)
+        return DocumentPreview.objects.get(request=clearance_request)
+
+    def document(self, image_format, pages=1):
+        buffer = io.BytesIO()
+        images = [Image.new('RGB', (600, 800), 'white') for _ in range(pages)]
+        images[0].save(buffer, format=image_format, save_all=pages > 1, append_images=images[1:])
+        return buffer.getvalue()
+
+    def assertThumbnail(self, preview):
+        self.assertEqual(preview.status, 'ready', preview.error)
+        with preview.thumbnail.open('rb') as thumbnail:
+            image = Image.open(thumbnail)
+            self.assertEqual(image.format, 'JPEG')
+            self.assertLessEqual(image.width, previews.THUMBNAIL_WIDTH)
+
+    def test_image_preview(self):
+        preview = self.preview_of('scan.png', self.document('PNG'))
+        self.assertThumbnail(preview)
+        self.assertEqual(preview.page_count, 1)
+
+    def test_pdf_preview(self):
+        preview = self.preview_of('form.pdf', self.document('PDF', pages=2))
+        self.assertThumbnail(preview)
+        self.assertEqual(preview.page_count, 2)
+
+    def test_broken_document_is_marked_failed(self):
+        with self.assertLogs('clearance.previews', 'WARNING'):
+            preview = self.preview_of('form.pdf', b'%PDF-1.4 truncated')
+        self.assertEqual(preview.status, 'failed')
+        self.assertTrue(preview.error)
+
+
+@override_settings(EVENT_STREAM={'BACKEND': 'clearance.events.LocalBackend', 'OPTIONS': {}})
+class EventStreamTests(ClearanceDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.request = Request.objects.create(
+            student=self.student, clearance_type=self.library, file='documents/form.pdf', assigned_staff=self.staff
+        )
+        self.token = ClearanceAccessToken.for_user(self.student)
+
+    def test_wsgi_server_gets_501(self):
+        response = Client().get(f'/clearance/events/?token={self.token}')
+        self.assertEqual(response.status_code, 501)
+
+    def test_stream_delivers_published_events(self):
+        async def read():
+            response = await AsyncClient().get(f'/clearance/events/?token={self.token}')
+            self.assertEqual(response.status_code, 200)
+            chunks = aiter(response.streaming_content)
+            self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+            self.assertEqual(await anext(chunks), f'data: {events.RESYNC}\n\n'.encode())
+            events.get_backend().publish(events.user_channel(self.student.id), '{"type": "ping"}')
+            message = await anext(chunks)
+            await chunks.aclose()
+            return message
+
+        self.assertEqual(async_to_sync(read)(), b'data: {"type": "ping"}\n\n')
+        # Closing the stream drops its subscription
+        self.assertFalse(events.broker._subscriptions)
+
+    def test_decision_is_published_on_commit(self):
+        client = self.client_for(self.staff)
+
+        def decide():
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = client.post(reverse('update-request-status', args=[self.request.id]), {'status': 'approved'})
+            self.assertEqual(response.status_code, 200)
+            return callbacks
+
+        channels = events.user_channels(self.staff)
+
+        async def receive():
+            queue = events.broker.subscribe(channels)
+            try:
+                callbacks = await sync_to_async(decide)()
+                await asyncio.sleep(0.05)
+                self.assertTrue(queue.queue.empty())
+                for callback in callbacks:
+                    await sync_to_async(callback)()
+                return json.loads(await queue.get(timeout=1))
+            finally:
+                queue.close()
+
+        event = async_to_sync(receive)()
+        self.assertEqual(event['type'], 'request.updated')
+        self.assertEqual(
+            [(delta['id'], delta['status'], delta['version']) for delta in event['requests']],
+            [(self.request.id, 'approved', self.request.version + 1)],
+        )
+
+    def test_overflowing_subscriber_is_told_to_resync(self):
+        async def overflow():
+            subscription = events.broker.subscribe([events.user_channel(self.student.id)])
+            try:
+                for i in range(events.SUBSCRIPTION_BUFFER + 1):
+                    events.broker.dispatch(events.user_channel(self.student.id), json.dumps({'type': 'ping', 'n': i}))
+                await asyncio.sleep(0.05)
+                messages = []
+                while not subscription.queue.empty():
+                    messages.append(await subscription.get(timeout=1))
+                return messages
+            finally:
+                subscription.close()
+
+        self.assertEqual(async_to_sync(overflow)(), [events.RESYNC])
+
+
+class UpdateRequestStatusTests(ClearanceDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.request = Request.objects.create(
+            student=self.student, clearance_type=self.library, file='documents/form.pdf', assigned_staff=self.staff
+        )
+        self.url = reverse('update-request-status', args=[self.request.id])
+        self.client = self.client_for(self.staff)
+
+    def test_decision_on_current_version(self):
+        response = self.client.post(self.url, {'status': 'approved', 'version': self.request.version, 'remarks': 'OK'})
+
+        self.assertEqual(response.status_code, 200)
+        decided = Request.objects.get(id=self.request.id)
+        self.assertEqual((decided.status, decided.version), ('approved', self.request.version + 1))
+        self.assertEqual(Report.objects.get(request=self.request).status, 'approved')
+
+    def test_decision_on_stale_version_conflicts(self):
+        loaded_version = self.request.version
+        self.assertEqual(self.client.post(self.url, {'status': 'approved', 'version': loaded_version}).status_code, 200)
+
+        # A second decision made on the page loaded before the first one
+        response = self.client.post(self.url, {'status': 'rejected', 'version': loaded_version, 'remarks': 'Missing'})
+
+        self.assertEqual(response.status_code, 409)
+        decided = Request.objects.get(id=self.request.id)
+        self.assertEqual((decided.status, decided.version), ('approved', loaded_version + 1))
+        self.assertEqual(Report.objects.get(request=self.request).status, 'approved')
+
+    def test_version_must_be_a_number(self):
+        response = self.client.post(self.url, {'status': 'approved', 'version': 'latest'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Request.objects.get(id=self.request.id).status, 'pending')
+
+
+class BulkUpdateRequestStatusTests(ClearanceDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_staff = make_user('STF002', 'staff', clearance_type=self.library)
+        self.add_rows(2)
+        self.own = list(Request.objects.filter(assigned_staff=self.staff).order_by('id'))
+        self.unassigned = Request.objects.create(student=self.student, clearance_type=self.library, file='documents/form.pdf')
+        self.foreign = Request.objects.create(
+            student=self.student, clearance_type=self.library, file='documents/form.pdf', assigned_staff=self.other_staff
+        )
+        self.url = reverse('bulk-update-request-status')
+        self.client = self.client_for(self.staff)
+
+    def statuses(self):
+        return dict(Request.objects.values_list('id', 'status'))
+
+    def test_ids_outside_the_staff_scope_are_not_found(self):
+        ids = [self.own[0].id, self.unassigned.id, self.foreign.id, 999999]
+
+        response = self.client.post(self.url, {'status': 'approved', 'ids': ids}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(response.data['results'], {
+            str(self.own[0].id): 'updated', str(self.unassigned.id): 'updated',
+            str(self.foreign.id): 'not_found', '999999': 'not_found',
+        })
+        statuses = self.statuses()
+        self.assertEqual(statuses[self.own[0].id], 'approved')
+        self.assertEqual(statuses[self.own[1].id], 'pending')
+        self.assertEqual(statuses[self.foreign.id], 'pending')
+        self.assertEqual(Report.objects.get(request=self.own[0]).status, 'approved')
+
+    def test_filter_decides_every_owned_request(self):
+        response = self.client.post(self.url, {'status': 'rejected', 'filter': {'status': 'pending'}}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], len(self.own) + 1)
+        statuses = self.statuses()
+        self.assertEqual({statuses[request.id] for request in self.own + [self.unassigned]}, {'rejected'})
+        self.assertEqual(statuses[self.foreign.id], 'pending')
+
+    def test_request_count_is_capped(self):
+        with mock.patch.object(BulkUpdateRequestStatusView, 'MAX_REQUESTS', 2):
+            too_many = self.client.post(
+                self.url, {'status': 'approved', 'ids': [request.id for request in self.own[:3]]}, format='json'
+            )
+            capped = self.client.post(self.url, {'status': 'approved', 'filter': {}}, format='json')
+
+        self.assertEqual(too_many.status_code, 400)
+        self.assertEqual(capped.data['updated'], 2)
+        self.assertEqual(sorted(int(request_id) for request_id in capped.data['results']), [request.id for request in self.own[:2]])
+
+    def test_bulk_decision_bumps_versions(self):
+        request = self.own[0]
+        self.client.post(self.url, {'status': 'approved', 'ids': [request.id]}, format='json')
+
+        self.assertEqual(Request.objects.get(id=request.id).version, request.version + 1)
+        # A single decision made on the version loaded before the bulk one is stale
+        response = self.client.post(
+            reverse('update-request-status', args=[request.id]), {'status': 'rejected', 'version': request.version}
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Request.objects.get(id=request.id).status, 'approved')
+
+    @override_settings(CLEARANCE_STATS_COUNTERS=True)
+    def test_counters_follow_the_bulk_decision(self):
+        counters.rebuild()
+
+        self.client.post(self.url, {'status': 'approved', 'filter': {'status': 'pending'}}, format='json')
+
+        self.assertEqual(counters.staff_stats(self.library.id), {
+            'total': Request.objects.filter(clearance_type=self.library).count(),
+            'approved': len(self.own) + 1,
+            'pending': 1,
+        })
+
+
+class AssignmentTests(ClearanceDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.second_staff = make_user('STF002', 'staff', clearance_type=self.library)
+        self.route = routing.route_for(self.library.id)
+
+    def submit(self, assigned_staff=None, status='pending'):
+        return Request.objects.create(
+            student=self.student, clearance_type=self.library, file='documents/form.pdf',
+            assigned_staff=assigned_staff, status=status,
+        )
+
+    def test_least_loaded_counts_only_pending_requests(self):
+        self.submit(self.staff)
+        self.submit(self.second_staff, status='approved')
+        self.submit(self.second_staff, status='approved')
+
+        self.assertEqual(assignment.pick_staff(self.route, self.student.department_key), self.second_staff)
+
+    @override_settings(CLEARANCE_ASSIGNMENT_STRATEGY='round_robin')
+    def test_round_robin_wraps_around(self):
+        picked = []
+        for _ in range(3):
+            staff = assignment.pick_staff(self.route, self.student.department_key)
+            self.submit(staff)
+            picked.append(staff)
+
+        self.assertEqual(picked, [self.staff, self.second_staff, self.staff])
+
+    @override_settings(CLEARANCE_ASSIGNMENT_STRATEGY='random')
+    def test_unknown_strategy_is_rejected(self):
+        with self.assertRaises(ValueError):
+            assignment.pick_staff(self.route, self.student.department_key)
+
+    def test_backfill_keeps_old_requests_in_a_queue(self):
+        self.submit(self.staff)
+        pending = self.submit()
+        decided = self.submit(status='approved')
+        Report.objects.create(request=decided, staff=self.staff, status='approved', remarks='Checked')
+
+        call_command('assign_existing_requests', stdout=StringIO())
+
+        self.assertEqual(Request.objects.get(id=pending.id).assigned_staff, self.second_staff)
+        self.assertEqual(Request.objects.get(id=decided.id).assigned_staff, self.staff)
+        response = self.client_for(self.staff).get(reverse('assigned-requests'))
+        self.assertIn(decided.id, [row['id'] for row in response.data])
+
+
+class DocumentUploadTests(TempMediaMixin, ClearanceDataMixin, TestCase):
+    DOCUMENT = b'%PDF-1.4 clearance form'
+
+    def submit(self, student, content, name='form.pdf'):
+        return self.client_for(student).post(
+            reverse('submit-clearance', args=['library']), {'file': SimpleUploadedFile(name, content)}
+        )
+
+    def test_identical_documents_share_one_blob(self):
+        other_student = make_user('ENR999', 'student')
+
+        first = self.submit(self.student, self.DOCUMENT)
+        second = self.submit(other_student, self.DOCUMENT, name='copy.pdf')
+
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        blob = DocumentBlob.objects.get()
+        self.assertEqual(blob.sha256, hashlib.sha256(self.DOCUMENT).hexdigest())
+        self.assertEqual(blob.file.name, documents.blob_name(blob.sha256, 'application/pdf'))
+        self.assertEqual(set(Request.objects.values_list('file', flat=True)), {blob.file.name})
+        with blob.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.DOCUMENT)
+
+    def test_unsupported_type_is_rejected(self):
+        response = self.submit(self.student, b'just some text', name='form.pdf')
+
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(Request.objects.exists())
+        self.assertFalse(DocumentBlob.objects.exists())
+
+    @override_settings(DOCUMENT_UPLOAD_MAX_SIZE=16)
+    def test_oversized_document_is_rejected(self):
+        response = self.submit(self.student, self.DOCUMENT)
+
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Request.objects.exists())
+
+    @override_settings(DOCUMENT_UPLOAD_MAX_SIZE=16)
+    def test_size_is_checked_as_chunks_arrive(self):
+        # Bodies sent without a Content-Length only reveal their size while streaming
+        handler = documents.HashingFileUploadHandler()
+        handler.handle_raw_input(None, {}, None, b'boundary')
+        handler.new_file('file', 'form.pdf', 'application/pdf', None)
+        handler.receive_data_chunk(self.DOCUMENT[:10], 0)
+
+        with self.assertRaises(documents.DocumentTooLarge):
+            handler.receive_data_chunk(self.DOCUMENT[10:], 10)
+
+
+class CommentThreadTests(ClearanceDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.request = Request.objects.create(
+            student=self.student, clearance_type=self.library, file='documents/form.pdf', assigned_staff=self.staff
+        )
+        self.url = reverse('request-comments', args=[self.request.id])
+
+    def post(self, user, content):
+        return self.client_for(user).post(self.url, {'content': content}, format='json')
+
+    def test_comments_go_between_student_and_assigned_staff(self):
+        from_student = self.post(self.student, 'Signed form attached.')
+        from_staff = self.post(self.staff, 'Thanks.')
+
+        self.assertEqual((from_student.status_code, from_staff.status_code), (201, 201))
+        self.assertEqual((from_student.data['sender'], from_student.data['recipient']), (self.student.id, self.staff.id))
+        self.assertEqual((from_staff.data['sender'], from_staff.data['recipient']), (self.staff.id, self.student.id))
+
+    def test_outsiders_cannot_read_or_post(self):
+        outsider = make_user('ENR999', 'student')
+
+        self.assertEqual(self.client_for(outsider).get(self.url).status_code, 403)
+        self.assertEqual(self.post(outsider, 'Hello').status_code, 403)
+
+    def test_thread_pages_oldest_first(self):
+        for i in range(3):
+            self.post(self.student, f'Message {i}')
+        client = self.client_for(self.staff)
+
+        first = client.get(self.url, {'page_size': 2})
+        second = client.get(self.url, {'page_size': 2, 'cursor': first.data['next_cursor']})
+
+        self.assertEqual([comment['content'] for comment in first.data['results']], ['Message 0', 'Message 1'])
+        self.assertEqual([comment['content'] for comment in second.data['results']], ['Message 2'])
+        self.assertIsNone(second.data['next_cursor'])
+
+    def test_unread_counts_and_marking_read(self):
+        first = self.post(self.student, 'One').data
+        self.post(self.student, 'Two')
+        client = self.client_for(self.staff)
+        unread = lambda: client.get(reverse('unread-comment-count')).data['unread']
+        mark_read = lambda data: client.post(reverse('request-comments-read', args=[self.request.id]), data, format='json')
+
+        self.assertEqual(unread(), 2)
+        self.assertEqual(mark_read({'ids': [first['id']]}).data['marked_read'], 1)
+        self.assertEqual(unread(), 1)
+        self.assertEqual(mark_read({}).data['marked_read'], 1)
+        self.assertEqual(unread(), 0)
+        # The student's own comments aren't addressed to them
+        self.assertEqual(self.client_for(self.student).get(reverse('unread-comment-count')).data['unread'], 0)
+
+    def test_request_lists_carry_comment_counts(self):
+        self.post(self.student, 'One')
+        self.post(self.staff, 'Two')
+
+        rows = self.client_for(self.student).get(reverse('my-requests')).data
+        row = next(row for row in rows if row['id'] == self.request.id)
+
+        self.assertEqual((row['comment_count'], row['unread_comment_count']), (2, 1))
+
+
+class ClearanceStatsTests(ClearanceDataMixin, TestCase):
+    # Six library requests, one of them approved
+    STAFF_STATS = {'totalStudents': 6, 'clearedStudents': 1, 'pendingStudents': 5, 'percentage': 16}
+
+    def setUp(self):
+        super().setUp()
+        ClearanceType.objects.create(clearance_type='lab')
+        self.add_rows(3)
+        self.decided = Request.objects.filter(student=self.student).order_by('id').first()
+        self.decided.status = 'approved'
+        self.decided.save()
+
+    def test_student_stats_run_one_query(self):
+        client = self.client_for(self.student)
+        # Fills the clearance type registry
+        client.get(reverse('student-clearance-stats'))
+
+        with self.assertNumQueries(1):
+            response = client.get(reverse('student-clearance-stats'))
+
+        self.assertEqual(response.data, {'completed': 1, 'pending': 2, 'total': 2, 'percentage': 50})
+
+    def test_staff_stats_run_one_query(self):
+        client = self.client_for(self.staff)
+        client.get(reverse('staff-clearance-stats'))
+
+        with self.assertNumQueries(1):
+            response = client.get(reverse('staff-clearance-stats'))
+
+        self.assertEqual(response.data, self.STAFF_STATS)
+
+    @override_settings(CLEARANCE_STATS_COUNTERS=True)
+    def test_counters_follow_saves_and_deletes(self):
+        call_command('rebuild_request_counters', stdout=StringIO())
+        rejected = Request.objects.filter(status='pending').order_by('id').first()
+        rejected.status = 'rejected'
+        rejected.save()
+        Request.objects.filter(status='pending').order_by('id').last().delete()
+        Request.objects.create(student=self.student, clearance_type=self.library, file='documents/form.pdf')
+
+        self.assertEqual(counters.staff_stats(self.library.id), {'total': 6, 'approved': 1, 'pending': 4})
+        response = self.client_for(self.staff).get(reverse('staff-clearance-stats'))
+        self.assertEqual(response.data['pendingStudents'], 4)
+
+    @override_settings(CLEARANCE_STATS_COUNTERS=True)
+    def test_rebuild_matches_the_request_table(self):
+        # Rows written while counters were off aren't counted until the rebuild
+        self.assertEqual(counters.staff_stats(self.library.id)['total'], 0)
+
+        call_command('rebuild_request_counters', stdout=StringIO())
+
+        self.assertEqual(counters.staff_stats(self.library.id), {'total': 6, 'approved': 1, 'pending': 5})
+        response = self.client_for(self.staff).get(reverse('staff-clearance-stats'))
+        self.assertEqual(response.data, self.STAFF_STATS)
@@ -0,0 +1,134 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+
+from .documents import UnsupportedDocumentType, sniff_content_type
+
+'''
+Chunk storage for resumable uploads (clearance.models.UploadSession).
+
+Every PUT is written straight to the media storage as uploads/<session id>/<offset>,
+so a worker is only busy for one chunk and a retry only resends the chunks that are
+missing. Completing the upload streams the chunks in order into one temporary file,
+hashing it on the way, and hands it to clearance.documents.store_document().
+'''
+
+COPY_BLOCK_SIZE = 64 * 1024
+
+
+class IncompleteUpload(Exception):
+    pass
+
+
+def max_chunk_size():
+    return getattr(settings, 'UPLOAD_CHUNK_MAX_SIZE', 16 * 1024 * 1024)
+
+
+def _chunk_name(session, offset):
+    return f'{session.chunk_dir}/{offset}'
+
+
+def stored_chunks(session):
+    """ [(offset, length, storage name)] ordered by offset. """
+    try:
+        _, files = default_storage.listdir(session.chunk_dir)
+    except FileNotFoundError:
+        return []
+    chunks = []
+    for name in files:
+        if name.isdigit():
+            path = _chunk_name(session, name)
+            chunks.append((int(name), default_storage.size(path), path))
+    return sorted(chunks)
+
+
+def received_ranges(session):
+    """ Byte ranges [start, end) received so far, overlapping chunks merged. """
+    ranges = []
+    for offset, length, _ in stored_chunks(session):
+        if ranges and offset <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], offset + length)
+        else:
+            ranges.append([offset, offset + length])
+    return ranges
+
+
+def missing_ranges(session, ranges=None):
+    ranges = received_ranges(session) if ranges is None else ranges
+    missing, position = [], 0
+    for start, end in ranges:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < session.size:
+        missing.append([position, session.size])
+    return missing
+
+
+def accepts_chunk(session, offset, length, ranges=None):
+    """
+    Whether a chunk may be stored at `offset`. Offsets are multiples of the chunk size,
+    so retries replace a chunk instead of adding an overlapping one, or the start of a
+    missing range the chunk fits into, which lets a client resume after a short chunk
+    or a chunk size change. Either way a session stores about its size at most.
+    """
+    if offset % max_chunk_size() == 0:
+        return True
+    return any(start == offset and offset + length <= end for start, end in missing_ranges(session, ranges))
+
+
+def write_chunk(session, offset, stream, length):
+    """ Store `length` bytes read from `stream` at `offset`, replacing an earlier attempt. """
+    name = _chunk_name(session, offset)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    saved = default_storage.save(name, File(stream))
+    if default_storage.size(saved) != length:
+        # Client went away mid-chunk, keep nothing so the chunk shows up as missing
+        default_storage.delete(saved)
+        raise IncompleteUpload(f'Expected {length} bytes at offset {offset}.')
+
+
+def delete_chunks(session):
+    for _, _, name in stored_chunks(session):
+        default_storage.delete(name)
+
+
+def assemble(session):
+    """
+    Concatenate the chunks into a temporary file, returns (file, sha256, content type).
+    Raises IncompleteUpload if any byte range is missing.
+    """
+    assembled = TemporaryUploadedFile('document', 'application/octet-stream', session.size, None)
+    hasher = hashlib.sha256()
+    position = 0
+    content_type = None
+    try:
+        for offset, length, name in stored_chunks(session):
+            if offset > position:
+                raise IncompleteUpload(f'Bytes {position}-{offset} are missing.')
+            if offset + length <= position:
+                continue
+            with default_storage.open(name, 'rb') as chunk:
+                # Skip the part an overlapping earlier chunk already supplied
+                chunk.seek(position - offset)
+                for block in iter(lambda: chunk.read(COPY_BLOCK_SIZE), b''):
+                    if position == 0:
+                        content_type = sniff_content_type(block)
+                        if content_type is None:
+                            raise UnsupportedDocumentType()
+                    hasher.update(block)
+                    assembled.write(block)
+                    position += len(block)
+        if position != session.size:
+            raise IncompleteUpload(f'Received {position} of {session.size} bytes.')
+    except Exception:
+        assembled.close()
+        raise
+
+    assembled.seek(0)
+    assembled.size = position
+    return assembled, hasher.hexdigest(), content_type
@@ -1,8 +1,13 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 
+from clearance import async_views
 from clearance.views import *
 
+# ASGI deployments serve the read endpoints from clearance.async_views
+ASYNC_READ_VIEWS = getattr(settings, 'ASYNC_READ_VIEWS', False)
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     
@@ -10,15 +15,35 @@ urlpatterns = [
     path('project/', ProjectClearanceView.as_view(), name='submit-project-clearance'),
     path('lab/', LabClearanceView.as_view(), name='submit-lab-clearance'),
     path('library/', LibraryClearanceView.as_view(), name='submit-library-clearance'),
-    path('student-stats/', StudentClearanceStatsView.as_view(), name='student-clearance-stats'),
-    path('my-requests/', RequestStatusView.as_view(), name='my-requests'),
-    path('student-history/', StudentHistoryView.as_view(), name='student-history'),
+    path('submit/<str:clearance_type>/', SubmitClearanceRequestView.as_view(), name='submit-clearance'),
+    # Resumable document upload: create, PUT chunks with ?offset=, then complete
+    path('uploads/', UploadSessionCreateView.as_view(), name='upload-session-create'),
+    path('uploads/<uuid:session_id>/', UploadSessionView.as_view(), name='upload-session'),
+    path('uploads/<uuid:session_id>/complete/', UploadSessionCompleteView.as_view(), name='upload-session-complete'),
+    # Everything the student home page shows, with ETag / If-None-Match
+    path('dashboard/', StudentDashboardView.as_view(), name='student-dashboard'),
+    path('student-stats/', async_views.student_clearance_stats if ASYNC_READ_VIEWS else StudentClearanceStatsView.as_view(), name='student-clearance-stats'),
+    path('my-requests/', async_views.request_status if ASYNC_READ_VIEWS else RequestStatusView.as_view(), name='my-requests'),
+    path('student-history/', async_views.student_history if ASYNC_READ_VIEWS else StudentHistoryView.as_view(), name='student-history'),
     
     ####################################### STAFF URLS #######################################
     path('assigned-students/', AssignedStudentsView.as_view(), name='assigned-students'),
-    path('assigned-requests/', AssignedRequestsView.as_view(), name='assigned-requests'),
+    path('assigned-requests/', async_views.assigned_requests if ASYNC_READ_VIEWS else AssignedRequestsView.as_view(), name='assigned-requests'),
     path('update-request/<int:request_id>/', UpdateRequestStatusView.as_view(), name='update-request-status'),
-    path('stats/', StaffClearanceStatsView.as_view(), name='staff-clearance-stats'),
+    path('bulk-update-requests/', BulkUpdateRequestStatusView.as_view(), name='bulk-update-request-status'),
+    # Queue, counters and recent decisions with ETag / If-None-Match
+    path('staff-dashboard/', StaffDashboardView.as_view(), name='staff-dashboard'),
+    path('stats/', async_views.staff_clearance_stats if ASYNC_READ_VIEWS else StaffClearanceStatsView.as_view(), name='staff-clearance-stats'),
+    # Access-controlled document downloads
+    path('requests/<int:request_id>/document/', DocumentDownloadView.as_view(), {'kind': 'request'}, name='request-document'),
+    path('requests/<int:request_id>/report-document/', DocumentDownloadView.as_view(), {'kind': 'report'}, name='report-document'),
+    path('requests/<int:request_id>/preview/', DocumentDownloadView.as_view(), {'kind': 'preview'}, name='request-preview'),
+    # Comment threads, for the student and the staff handling the request
+    path('requests/<int:request_id>/comments/', CommentListView.as_view(), name='request-comments'),
+    path('requests/<int:request_id>/comments/read/', CommentMarkReadView.as_view(), name='request-comments-read'),
+    path('comments/unread-count/', UnreadCommentCountView.as_view(), name='unread-comment-count'),
+    # Server-sent events for request and comment changes, replaces polling the lists
+    path('events/', event_stream, name='event-stream'),
     path('staff-history/', StaffHistoryView.as_view(), name='student-history'),
     
     ####################################### ADMIN URLS #######################################
@@ -5,143 +5,251 @@ from rest_framework import status
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework import status
-from .models import Request as ClearanceRequest
-from rolepermissions.checkers import has_permission, has_role
-from django.db.models import Q
+from .models import Comment, Request as ClearanceRequest, UploadSession
+from accounts.permissions import user_has_permission, user_has_role
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.conf import settings
+from django.utils import timezone
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+import asyncio
 import traceback
 import logging
 
 from accounts.serializers import UserSerializer
 from accounts.models import *
+from accounts import clearance_types
+from . import assignment, dashboards, documents, downloads, events, previews, routing, uploads
 from .serializers import *
+from .queries import request_list_queryset, assigned_students_queryset
+from . import counters
+from .pagination import InvalidCursor, wants_pagination, paginate_requests, paginate_comments, get_page_size, student_keyset_value, student_cursor
+from accounts.mixins import parse_fields_param
+from accounts.authentication import ClaimsJWTAuthentication
 
 logger = logging.getLogger(__name__)
 ########################################### STUDENT VIEWS #############################################
+def submission_route(user, clearance_name):
+    """
+    Route for a new request of `clearance_name` by `user`, shared by the direct and the
+    resumable submit paths. Returns (route, None) or (None, error response).
+    """
+    if not user_has_permission(user, 'submit_request'):
+        return None, Response({'error': 'Permission denied! Only a student can submit a clearance request.'}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        route = routing.route_by_name(clearance_name)
+    except ClearanceType.DoesNotExist:
+        return None, Response({'error': 'Invalid clearance type.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Each student can only submit each clearance type once
+    if Request.objects.filter(student_id=user.id, clearance_type_id=route.clearance_type_id).exists():
+        return None, Response({'error': f'You have already submitted a {route.name} clearance request.'},
+                              status=status.HTTP_400_BAD_REQUEST)
+    return route, None
+
+
+def create_clearance_request(request, route, store_document):
+    """
+    Assign the request and create it. `store_document` returns the document's storage
+    name and is only called once a staff member was found.
+    """
+    # Assign to one eligible staff member, limited to the student's department for department scoped types
+    staff = assignment.pick_staff(route, request.user.department_key)
+
+    if staff is None:
+        return None, Response({'error': 'No staff available to handle this type of clearance.'}, status=status.HTTP_404_NOT_FOUND)
+
+    clearance_request = ClearanceRequest.objects.create(
+        student_id=request.user.id,
+        clearance_type_id=route.clearance_type_id,
+        assigned_staff=staff,
+        file=store_document()
+    )
+    # Thumbnail, page count and text are extracted off the request path
+    previews.schedule(clearance_request)
+    events.publish_requests('request.created', [(clearance_request, request.user.department_key)])
+
+    serializer = RequestSerializer(clearance_request, context={'request': request})
+    return clearance_request, Response({'message': 'Request submitted successfully.', 'request': serializer.data}, status=status.HTTP_201_CREATED)
+
+
 class SubmitClearanceRequestView(APIView):
     permission_classes = [IsAuthenticated]
-    parser_classes = [MultiPartParser, FormParser]
-
-    clearance_type = None  # to be overridden in subclasses
+    # Streams the document to disk while hashing it, see clearance.documents
+    parser_classes = [documents.DocumentMultiPartParser, FormParser]
 
-    def post(self, request):
-        user = request.user
+    clearance_type = None  # set by subclasses, or taken from the URL for submit/<clearance_type>/
 
-        if not has_permission(user, 'submit_request'):
-            return Response({'error': 'Permission denied! Only a student can submit a clearance request.'}, status=status.HTTP_403_FORBIDDEN)
+    def post(self, request, clearance_type=None):
+        clearance_name = clearance_type or self.clearance_type
 
-        if not self.clearance_type:
+        if not clearance_name:
             return Response({'error': 'No clearance type defined in view.'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            file = request.data.get('file')
-            if not file:
-                return Response({'error': 'File is required.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            try:
-                clearance_type = ClearanceType.objects.get(clearance_type__iexact=self.clearance_type)
-            except ClearanceType.DoesNotExist:
-                return Response({'error': 'Invalid clearance type.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Route to staff with specific clearance type and department for project and lab
-            if clearance_type.clearance_type.lower() in ['project', 'lab']:
-                staff_qs = User.objects.filter(
-                    role='staff',
-                    clearance_type=clearance_type,
-                    department=user.department,
-                    is_active=True
-                )
-            else: # Only check clearance_type if library clearance, student can be from any department
-                staff_qs = User.objects.filter(
-                    role='staff',
-                    clearance_type=clearance_type,
-                    is_active=True
-                )
+            route, error = submission_route(request.user, clearance_name)
+            if error:
+                return error
 
-            if not staff_qs.exists():
-                return Response({'error': 'No staff available to handle this type of clearance.'}, status=status.HTTP_404_NOT_FOUND)
-
-            clearance_request = ClearanceRequest.objects.create(
-                student=user,
-                clearance_type=clearance_type,
-                file=file
-            )
+            file = request.FILES.get('file')
+            if not file:
+                return Response({'error': 'Document is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-            serializer = RequestSerializer(clearance_request, context={'request': request})
-            return Response({'message': 'Request submitted successfully.', 'request': serializer.data}, status=status.HTTP_201_CREATED)
+            # Content addressed, an identical document already on file is reused
+            _, response = create_clearance_request(request, route, lambda: documents.store_uploaded_document(file))
+            return response
 
+        except documents.DocumentRejected as e:
+            return Response({'error': str(e.detail)}, status=e.status_code)
         except Exception as e:
             return Response({'error': f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-# Subclasses for each type of clearance - each student can only submit each once
+# Subclasses for the original per-type endpoints, new clearance types use submit/<clearance_type>/
 class ProjectClearanceView(SubmitClearanceRequestView):
+    clearance_type = 'project'
+
+class LabClearanceView(SubmitClearanceRequestView):
+    clearance_type = 'lab'
+
+class LibraryClearanceView(SubmitClearanceRequestView):
+    clearance_type = 'library'
+
+# Resumable submission of large documents: initiate, PUT chunks at offsets, then complete.
+# Chunks go straight to the media storage, see clearance.uploads
+class UploadSessionCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        student = request.user
-        clearance_type = ClearanceType.objects.get(clearance_type='project')
+        try:
+            route, error = submission_route(request.user, request.data.get('clearance_type'))
+            if error:
+                return error
 
-        # Check if the student already submitted a request for this clearance type
-        if Request.objects.filter(student=student, clearance_type=clearance_type).exists():
-            return Response({'error': 'You have already submitted a project clearance request.'},
-                            status=status.HTTP_400_BAD_REQUEST)
+            try:
+                size = int(request.data.get('size'))
+            except (TypeError, ValueError):
+                return Response({'error': 'size must be the document size in bytes.'}, status=status.HTTP_400_BAD_REQUEST)
+            if size <= 0:
+                return Response({'error': 'size must be the document size in bytes.'}, status=status.HTTP_400_BAD_REQUEST)
+            if size > documents.max_document_size():
+                return Response({'error': str(documents.DocumentTooLarge().detail)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+            session = UploadSession.objects.create(
+                student_id=request.user.id,
+                clearance_type_id=route.clearance_type_id,
+                size=size,
+                expires_at=timezone.now() + settings.UPLOAD_SESSION_LIFETIME,
+            )
+            return Response({
+                'id': str(session.id),
+                'size': session.size,
+                'chunk_size': uploads.max_chunk_size(),
+                'expires_at': session.expires_at,
+            }, status=status.HTTP_201_CREATED)
 
-        # Handle file & form data
-        uploaded_file = request.FILES.get('file')
-        if not uploaded_file:
-            return Response({'error': 'Document is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'error': f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        new_request = Request.objects.create(
-            student=student,
-            clearance_type=clearance_type,
-            file=uploaded_file
-        )
-        return Response({'message': 'Request submitted successfully.'}, status=status.HTTP_201_CREATED)
-class LabClearanceView(SubmitClearanceRequestView):
+
+class UploadSessionView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def post(self, request):
-        student = request.user
-        clearance_type = ClearanceType.objects.get(clearance_type='lab')
+    def get_session(self, request, session_id):
+        return UploadSession.objects.filter(
+            id=session_id, student_id=request.user.id, expires_at__gt=timezone.now()
+        ).first()
+
+    def progress(self, session):
+        ranges = uploads.received_ranges(session)
+        return {
+            'id': str(session.id),
+            'size': session.size,
+            'received': ranges,
+            'missing': uploads.missing_ranges(session, ranges),
+            'completed': session.request_id is not None,
+        }
+
+    def get(self, request, session_id):
+        session = self.get_session(request, session_id)
+        if session is None:
+            return Response({'error': 'Upload not found or expired.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.progress(session))
+
+    def put(self, request, session_id):
+        session = self.get_session(request, session_id)
+        if session is None:
+            return Response({'error': 'Upload not found or expired.'}, status=status.HTTP_404_NOT_FOUND)
+        if session.request_id is not None:
+            return Response({'error': 'Upload already completed.'}, status=status.HTTP_409_CONFLICT)
 
-        # Check if the student already submitted a request for this clearance type
-        if Request.objects.filter(student=student, clearance_type=clearance_type).exists():
-            return Response({'error': 'You have already submitted a lab clearance request.'},
-                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            offset = int(request.query_params.get('offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return Response({'error': 'offset must be a byte offset.'}, status=status.HTTP_400_BAD_REQUEST)
+        if length <= 0:
+            return Response({'error': 'Content-Length is required.'}, status=status.HTTP_411_LENGTH_REQUIRED)
+        if length > uploads.max_chunk_size():
+            return Response({'error': f'Chunks can be at most {uploads.max_chunk_size()} bytes.'},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if offset < 0 or offset + length > session.size:
+            return Response({'error': 'Chunk is outside the declared document size.'},
+                            status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        if not uploads.accepts_chunk(session, offset, length):
+            return Response({
+                'error': f'offset must be a multiple of {uploads.max_chunk_size()} or the start of a missing range it fits.',
+                **self.progress(session),
+            }, status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
 
-        # Handle file & form data
-        uploaded_file = request.FILES.get('file')
-        if not uploaded_file:
-            return Response({'error': 'Document is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Read from the raw request stream, the body is never parsed or buffered whole
+            uploads.write_chunk(session, offset, request._request, length)
+            return Response(self.progress(session))
+        except uploads.IncompleteUpload as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'error': f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        new_request = Request.objects.create(
-            student=student,
-            clearance_type=clearance_type,
-            file=uploaded_file
-        )
-        return Response({'message': 'Request submitted successfully.'}, status=status.HTTP_201_CREATED)
-    
-class LibraryClearanceView(SubmitClearanceRequestView):
-    permission_classes = [IsAuthenticated]
 
-    def post(self, request):
-        student = request.user
-        clearance_type = ClearanceType.objects.get(clearance_type='library')
+class UploadSessionCompleteView(UploadSessionView):
+    def post(self, request, session_id):
+        session = self.get_session(request, session_id)
+        if session is None:
+            return Response({'error': 'Upload not found or expired.'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Check if the student already submitted a request for this clearance type
-        if Request.objects.filter(student=student, clearance_type=clearance_type).exists():
-            return Response({'error': 'You have already submitted a library clearance request.'},
-                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            if session.request_id is not None:
+                # Retried completion, e.g. after a lost response
+                serializer = RequestSerializer(session.request, context={'request': request})
+                return Response({'message': 'Request submitted successfully.', 'request': serializer.data})
 
-        # Handle file & form data
-        uploaded_file = request.FILES.get('file')
-        if not uploaded_file:
-            return Response({'error': 'Document is required.'}, status=status.HTTP_400_BAD_REQUEST)
+            route, error = submission_route(request.user, clearance_types.get_by_id(session.clearance_type_id).clearance_type)
+            if error:
+                return error
 
-        new_request = Request.objects.create(
-            student=student,
-            clearance_type=clearance_type,
-            file=uploaded_file
-        )
-        return Response({'message': 'Request submitted successfully.'}, status=status.HTTP_201_CREATED)
+            assembled, sha256, content_type = uploads.assemble(session)
+            try:
+                clearance_request, response = create_clearance_request(
+                    request, route, lambda: documents.store_document(assembled, sha256, content_type)
+                )
+            finally:
+                assembled.close()
+
+            if clearance_request is not None:
+                session.request = clearance_request
+                session.save(update_fields=['request'])
+                uploads.delete_chunks(session)
+            return response
+
+        except uploads.IncompleteUpload as e:
+            return Response({'error': str(e), **self.progress(session)}, status=status.HTTP_409_CONFLICT)
+        except documents.DocumentRejected as e:
+            return Response({'error': str(e.detail)}, status=e.status_code)
+        except Exception as e:
+            return Response({'error': f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 # For the student status
 class RequestStatusView(APIView):
@@ -157,7 +265,7 @@ class RequestStatusView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
 
-            pending_requests = Request.objects.filter(student=user, status='pending')
+            pending_requests = request_list_queryset(Request.objects.filter(student_id=user.id, status='pending'), user=user)
             serializer = RequestSerializer(pending_requests, many=True, context={'request': request})
 
             return Response(serializer.data, status=status.HTTP_200_OK)
@@ -182,11 +290,15 @@ class StudentClearanceStatsView(APIView):
             )
 
         try:
-            total_required = ClearanceType.objects.count()
+            total_required = clearance_types.count()
 
-            approved = Request.objects.filter(student=user, status='approved').count()
-            pending = Request.objects.filter(student=user, status='pending').count()
-            rejected = Request.objects.filter(student=user, status='rejected').count()
+            # One conditional aggregation over this student's requests
+            stats = Request.objects.filter(student_id=user.id).aggregate(
+                approved=Count('id', filter=Q(status='approved')),
+                pending=Count('id', filter=Q(status='pending')),
+                rejected=Count('id', filter=Q(status='rejected')),
+            )
+            approved, pending, rejected = stats['approved'], stats['pending'], stats['rejected']
 
             total_attempted = approved + pending + rejected
             total = max(total_required, total_attempted)
@@ -230,10 +342,10 @@ class StudentHistoryView(APIView):
                 )
 
             # Fetch completed requests
-            completed_requests = Request.objects.filter(
-                student=user,
+            completed_requests = request_list_queryset(Request.objects.filter(
+                student_id=user.id,
                 status__in=['approved', 'rejected']
-            ).select_related('clearance_type')
+            ), user=user)
 
             serializer = RequestSerializer(
                 completed_requests, many=True, context={'request': request}
@@ -247,6 +359,28 @@ class StudentHistoryView(APIView):
             )
 
 
+# Student home page in one round trip: profile, stats, pending requests and history.
+# Conditional GET, an unchanged dashboard is a 304 after two small queries
+class StudentDashboardView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        if user.role != 'student':
+            return Response({'error': 'Only students have a student dashboard.'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            etag, profile = dashboards.student_dashboard_etag(request, user)
+            if dashboards.is_not_modified(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+            data = dashboards.student_dashboard(request, user, profile)
+            return Response(data, status=status.HTTP_200_OK, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+
+        except Exception as e:
+            return Response({'error': f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 ########################################### STAFF VIEWS #############################################
 
 # for staff to get all students assigned to them based on clearance type of the request, and in some cases their department
@@ -258,7 +392,7 @@ class AssignedStudentsView(APIView):
             user = request.user
 
             # Check permission
-            if not has_permission(user, 'view_assigned_requests'):
+            if not user_has_permission(user, 'view_assigned_requests'):
                 return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
 
             # Get clearance type from query params
@@ -269,62 +403,34 @@ class AssignedStudentsView(APIView):
 
             # Validate clearance type
             try:
-                clearance_type = ClearanceType.objects.get(id=clearance_type_id)
+                clearance_type = clearance_types.get_by_id(clearance_type_id)
             except ClearanceType.DoesNotExist:
                 return Response({'error': 'Invalid clearance type ID.'}, status=status.HTTP_404_NOT_FOUND)
 
-            clearance_name = clearance_type.clearance_type.lower()
-            department_filter_needed = clearance_name in ['project', 'lab']
-
-            # Filter activated students (User model)
-            user_filter = Q(role='student')
-            if department_filter_needed:
-                user_filter &= Q(department=user.department)
-
-            activated_students = User.objects.filter(user_filter)
-
-            # Convert activated users to dict for merging
-            activated_serialized = UserSerializer(activated_students, many=True, context={'request': request}).data
-            activated_ids = set(u['id_number'] for u in activated_serialized)
-
-            # Filter unactivated students (ValidStudent model)
-            valid_student_filter = Q(status='active')
-            if department_filter_needed:
-                valid_student_filter &= Q(department=user.department)
-
-            unactivated_students = ValidStudent.objects.filter(valid_student_filter)
-
-            # Prepare pseudo-User-like dicts for ValidStudents
-            unactivated_serialized = [
-                {
-                    'id': None,
-                    'username': vs.enrollment_number,
-                    'first_name': vs.name.split()[0],
-                    'last_name': ' '.join(vs.name.split()[1:]) if len(vs.name.split()) > 1 else '',
-                    'email': vs.university_email,
-                    'department': vs.department,
-                    'avatar': request.build_absolute_uri(vs.avatar.url) if vs.avatar else None,
-                    'phone': vs.phone,
-                    'role': 'student',
-                    'is_active': False,
-                    'course': vs.course,
-                    'gpa': str(vs.gpa),
-                    'credits': vs.credits,
-                    'admission_date': vs.admission_date,
-                    'expected_graduation': vs.expected_graduation,
-                    'year': vs.year,
-                    'semester': vs.semester,
-                    'bio': vs.bio,
-                }
-                for vs in unactivated_students
-                if vs.enrollment_number not in activated_ids  # to avoid duplicates
-            ]
-
-            # Combine both
-            combined_students = activated_serialized + unactivated_serialized
-
-            return Response(combined_students, status=status.HTTP_200_OK)
-
+            # Activated (User) and unactivated (ValidStudent) students are merged in one
+            # union query, with already-activated ValidStudents removed by an anti-join
+            department = routing.route_for(clearance_type.id).student_department(user)
+            fields = parse_fields_param(request)
+
+            if not wants_pagination(request):
+                rows = assigned_students_queryset(department=department)
+                serializer = StudentRowSerializer(rows, many=True, fields=fields, context={'request': request})
+                return Response(serializer.data, status=status.HTTP_200_OK)
+
+            # Keyset on enrollment number, only the requested page is materialized
+            page_size = get_page_size(request)
+            rows = list(assigned_students_queryset(
+                department=department,
+                after=student_keyset_value(request),
+                limit=page_size + 1,
+            ))
+            next_cursor = student_cursor(rows[page_size - 1]['row_key']) if len(rows) > page_size else None
+
+            serializer = StudentRowSerializer(rows[:page_size], many=True, fields=fields, context={'request': request})
+            return Response({'results': serializer.data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -338,30 +444,37 @@ class AssignedRequestsView(APIView):
         user = request.user
 
         # Permission check
-        if not has_permission(user, 'view_assigned_requests'):
+        if not user_has_permission(user, 'view_assigned_requests'):
             return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
 
         if user.role != 'staff':
             return Response({'error': 'Only staff can view assigned requests.'}, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            staff_clearance_type = user.clearance_type
-            if not staff_clearance_type:
+            if not user.clearance_type_id:
                 return Response({'error': 'You are not assigned to any clearance type.'}, status=status.HTTP_400_BAD_REQUEST)
 
-            if staff_clearance_type.clearance_type.lower() in ['project', 'lab']:
-                requests = ClearanceRequest.objects.filter(
-                    clearance_type=staff_clearance_type,
-                    # normalizing case/spacing when comparing departments
-                    student__department__iexact=user.department.strip()
-                )
+            if request.query_params.get('scope') == 'all':
+                # Whole clearance type queue, scoped to the staff member's department for department scoped types
+                route = routing.route_for(user.clearance_type_id)
+                requests = ClearanceRequest.objects.filter(route.request_filter(user))
             else:
-                requests = ClearanceRequest.objects.filter(clearance_type=staff_clearance_type)
+                # Only the requests assigned to this staff member
+                requests = ClearanceRequest.objects.filter(assigned_staff_id=user.id)
 
+            fields = parse_fields_param(request)
+            requests = request_list_queryset(requests, fields=fields, user=user)
 
-            serializer = RequestSerializer(requests, many=True, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            if not wants_pagination(request):
+                serializer = RequestSerializer(requests, many=True, fields=fields, context={'request': request})
+                return Response(serializer.data, status=status.HTTP_200_OK)
+
+            page, next_cursor = paginate_requests(request, requests)
+            serializer = RequestSerializer(page, many=True, fields=fields, context={'request': request})
+            return Response({'results': serializer.data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
 
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             traceback.print_exc()  # To show the full stack trace in terminal
             return Response({'error': f'Unexpected error: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -373,43 +486,174 @@ class UpdateRequestStatusView(APIView):
     def post(self, request, request_id):
         user = request.user
 
-        if not has_permission(user, 'approve_requests') and not has_permission(user, 'reject_requests'):
+        if not user_has_permission(user, 'approve_requests') and not user_has_permission(user, 'reject_requests'):
             return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
 
+        # Get decision
+        decision = request.data.get('status')
+        remarks = request.data.get('remarks', '')
+
+        if decision not in ['approved', 'rejected']:
+            return Response({'error': 'Status must be "approved" or "rejected".'}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            clearance_request = ClearanceRequest.objects.get(id=request_id)
+            clearance_request = ClearanceRequest.objects.select_related('student').get(id=request_id)
 
             # Ensure staff is handling a request in their clearance_type
-            if clearance_request.clearance_type != user.clearance_type:
+            if clearance_request.clearance_type_id != user.clearance_type_id:
                 return Response({'error': 'You are not assigned to this clearance type.'}, status=status.HTTP_403_FORBIDDEN)
 
-            if clearance_request.clearance_type.clearance_type.lower() in ['project', 'lab'] and \
-                    clearance_request.student.department != user.department:
-                return Response({'error': 'This request is not from your department.'}, status=status.HTTP_403_FORBIDDEN)
-
-            # Get decision
-            decision = request.data.get('status')
-            remarks = request.data.get('remarks', '')
-
-            if decision not in ['approved', 'rejected']:
-                return Response({'error': 'Status must be "approved" or "rejected".'}, status=status.HTTP_400_BAD_REQUEST)
+            if clearance_request.assigned_staff_id and clearance_request.assigned_staff_id != user.id:
+                return Response({'error': 'This request is assigned to another staff member.'}, status=status.HTTP_403_FORBIDDEN)
 
-            # Save the report
-            report, created = Report.objects.update_or_create(
-                request=clearance_request,
-                staff=user,
-                defaults={'status': decision, 'remarks': remarks}
-            )
+            route = routing.route_for(clearance_request.clearance_type_id)
+            if not route.covers(user, clearance_request.student.department_key):
+                return Response({'error': 'This request is not from your department.'}, status=status.HTTP_403_FORBIDDEN)
 
-            clearance_request.status = decision
-            clearance_request.save()
+            # The version the staff member decided on, defaults to the one just loaded
+            try:
+                expected_version = int(request.data.get('version', clearance_request.version))
+            except (TypeError, ValueError):
+                return Response({'error': 'version must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            with transaction.atomic():
+                # Conditional UPDATE: only one of two concurrent decisions on the same version wins,
+                # and the row stays locked until the report below is written
+                updated = ClearanceRequest.objects.filter(id=clearance_request.id, version=expected_version).update(
+                    status=decision, version=F('version') + 1, updated_at=timezone.now()
+                )
+                if not updated:
+                    return Response({'error': 'This request was changed by someone else. Reload it and try again.'},
+                                    status=status.HTTP_409_CONFLICT)
+
+                report = Report.objects.filter(request=clearance_request).first()
+                if report is None:
+                    report = Report.objects.create(request=clearance_request, staff_id=user.id, status=decision, remarks=remarks)
+                else:
+                    report.staff_id, report.status, report.remarks = user.id, decision, remarks
+                    report.save(update_fields=['staff', 'status', 'remarks'])
+
+                counters.record_transition(
+                    clearance_request.clearance_type_id, clearance_request.student.department_key,
+                    clearance_request.status, decision
+                )
+                clearance_request.status, clearance_request.version = decision, expected_version + 1
+                events.publish_requests('request.updated', [(clearance_request, clearance_request.student.department_key)])
 
             serializer = ReportSerializer(report, context={'request': request})
             return Response({'message': 'Request status updated.', 'report': serializer.data}, status=status.HTTP_200_OK)
 
         except ClearanceRequest.DoesNotExist:
             return Response({'error': 'Request not found.'}, status=status.HTTP_404_NOT_FOUND)
+        except IntegrityError:
+            return Response({'error': 'This request was changed by someone else. Reload it and try again.'},
+                            status=status.HTTP_409_CONFLICT)
+        except Exception as e:
+            return Response({'error': f'Unexpected error: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+# Approve/reject many requests at once, e.g. clearing the library queue at the end of term
+class BulkUpdateRequestStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    MAX_REQUESTS = 5000
+
+    def post(self, request):
+        user = request.user
+
+        if not user_has_permission(user, 'approve_requests') and not user_has_permission(user, 'reject_requests'):
+            return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
+
+        if not user.clearance_type_id:
+            return Response({'error': 'You are not assigned to any clearance type.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        decision = request.data.get('status')
+        remarks = request.data.get('remarks', '')
+        if decision not in ['approved', 'rejected']:
+            return Response({'error': 'Status must be "approved" or "rejected".'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Either an explicit list of ids or a filter over the staff member's own requests
+        ids = request.data.get('ids')
+        request_filter = request.data.get('filter')
+        if ids is not None:
+            if not isinstance(ids, list):
+                return Response({'error': 'ids must be a list of request ids.'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                ids = list(dict.fromkeys(int(request_id) for request_id in ids))
+            except (TypeError, ValueError):
+                return Response({'error': 'ids must be a list of request ids.'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(ids) > self.MAX_REQUESTS:
+                return Response({'error': f'At most {self.MAX_REQUESTS} requests can be updated at once.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        elif isinstance(request_filter, dict) and set(request_filter) <= {'status'} and \
+                request_filter.get('status', 'pending') in ['pending', 'approved', 'rejected']:
+            request_filter = {'status': request_filter.get('status', 'pending')}
+        else:
+            return Response({'error': 'Provide "ids" or a "filter" such as {"status": "pending"}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            route = routing.route_for(user.clearance_type_id)
+            # Requests this staff member may decide on: assigned to them, or unassigned within their route
+            owned = Q(assigned_staff_id=user.id) | (Q(assigned_staff__isnull=True) & route.request_filter(user))
+
+            with transaction.atomic():
+                queryset = ClearanceRequest.objects.filter(owned)
+                if ids is not None:
+                    queryset = queryset.filter(id__in=ids)
+                else:
+                    queryset = queryset.filter(**request_filter).order_by('id')[:self.MAX_REQUESTS]
+
+                # One query validates ownership and locks the rows being decided
+                requests_to_update = list(
+                    queryset.select_for_update()
+                    .select_related('student')
+                    .only('id', 'status', 'version', 'clearance_type_id', 'assigned_staff_id', 'student__department_key')
+                )
+                found_ids = [clearance_request.id for clearance_request in requests_to_update]
+
+                existing_reports = {report.request_id: report for report in Report.objects.filter(request_id__in=found_ids)}
+                new_reports = []
+                transitions = {}
+                now = timezone.now()
+                for clearance_request in requests_to_update:
+                    report = existing_reports.get(clearance_request.id)
+                    if report is None:
+                        new_reports.append(Report(request=clearance_request, staff_id=user.id, status=decision, remarks=remarks))
+                    else:
+                        report.staff_id, report.status, report.remarks = user.id, decision, remarks
+
+                    key = (clearance_request.clearance_type_id, clearance_request.student.department_key, clearance_request.status)
+                    transitions[key] = transitions.get(key, 0) + 1
+                    clearance_request.status = decision
+                    clearance_request.version += 1
+                    clearance_request.updated_at = now
+
+                Report.objects.bulk_create(new_reports, batch_size=500)
+                Report.objects.bulk_update(existing_reports.values(), ['staff', 'status', 'remarks'], batch_size=500)
+                ClearanceRequest.objects.bulk_update(requests_to_update, ['status', 'version', 'updated_at'], batch_size=500)
+
+                # bulk_update sends no post_save, so counters are moved here in one step per bucket
+                for (clearance_type_id, department_key, old_status), count in transitions.items():
+                    counters.record_transition(clearance_type_id, department_key, old_status, decision, count=count)
+
+                events.publish_requests('request.updated', [
+                    (clearance_request, clearance_request.student.department_key) for clearance_request in requests_to_update
+                ])
+
+            results = {str(request_id): 'updated' for request_id in found_ids}
+            if ids is not None:
+                # Missing ids either don't exist or belong to another staff member's scope
+                for request_id in ids:
+                    results.setdefault(str(request_id), 'not_found')
+
+            return Response({
+                'message': f'{len(found_ids)} requests {decision}.',
+                'updated': len(found_ids),
+                'results': results,
+            }, status=status.HTTP_200_OK)
+
         except Exception as e:
+            logger.exception("Bulk request status update failed.")
             return Response({'error': f'Unexpected error: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 # Staff stats for their banner in front-end
@@ -420,28 +664,35 @@ class StaffClearanceStatsView(APIView):
         user = request.user
 
         # user has to have the 'staff' role
-        if not has_role(user, 'staff'):
+        if not user_has_role(user, 'staff'):
             return Response(
                 {"error": "You do not have permission to access staff clearance statistics."},
                 status=status.HTTP_403_FORBIDDEN
             )
 
         # user should have clearance_type assigned
-        if not user.clearance_type:
+        if not user.clearance_type_id:
             return Response(
                 {"error": "No clearance type assigned to this staff member."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
         try:
-            clearance_type_id = user.clearance_type.id
+            clearance_type_id = user.clearance_type_id
 
-            # filtering requests by clearance type
-            request_queryset = Request.objects.filter(clearance_type_id=clearance_type_id)
+            if counters.counters_enabled():
+                stats = counters.staff_stats(clearance_type_id)
+            else:
+                # filtering requests by clearance type, counted with one conditional aggregation
+                stats = Request.objects.filter(clearance_type_id=clearance_type_id).aggregate(
+                    total=Count('id'),
+                    approved=Count('id', filter=Q(status='approved')),
+                    pending=Count('id', filter=Q(status='pending')),
+                )
 
-            total_students = request_queryset.count()
-            cleared_students = request_queryset.filter(status="approved").count()
-            pending_students = request_queryset.filter(status="pending").count()
+            total_students = stats['total']
+            cleared_students = stats['approved']
+            pending_students = stats['pending']
 
             percentage_cleared = (
                 int((cleared_students / total_students) * 100) if total_students > 0 else 0
@@ -470,6 +721,32 @@ class StaffClearanceStatsView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+# Staff pages in one round trip: pending queue, counters and recent decisions.
+# Conditional GET, repeat polls of an unchanged clearance type are a 304 after one indexed aggregate
+class StaffDashboardView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+
+        if user.role != 'staff':
+            return Response({'error': 'Only staff can access this endpoint.'}, status=status.HTTP_403_FORBIDDEN)
+        if not user.clearance_type_id:
+            return Response({'error': 'You are not assigned to any clearance type.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            etag = dashboards.staff_dashboard_etag(user)
+            if dashboards.is_not_modified(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+            data = dashboards.staff_dashboard(request, user)
+            return Response(data, status=status.HTTP_200_OK, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'error': f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 # staff history
 class StaffHistoryView(APIView):
     permission_classes = [IsAuthenticated]
@@ -482,8 +759,10 @@ class StaffHistoryView(APIView):
 
         try:
             # only non-pending requests staff member has handled
-            reports = Report.objects.filter(staff=user).exclude(status='pending')
-            requests_handled = [report.request for report in reports]
+            requests_handled = request_list_queryset(
+                ClearanceRequest.objects.filter(report__staff_id=user.id).exclude(report__status='pending'),
+                user=user,
+            )
 
             serializer = RequestSerializer(requests_handled, many=True, context={'request': request})
             return Response(serializer.data, status=status.HTTP_200_OK)
@@ -493,4 +772,212 @@ class StaffHistoryView(APIView):
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+########################################### COMMENTS ################################################
+
+def comment_thread_request(user, request_id):
+    """ The request whose thread `user` wants, or (None, error response) if it is missing or off limits. """
+    try:
+        clearance_request = ClearanceRequest.objects.select_related('student', 'report').get(id=request_id)
+    except ClearanceRequest.DoesNotExist:
+        return None, Response({'error': 'Request not found.'}, status=status.HTTP_404_NOT_FOUND)
+    # Same participants as the request's documents
+    if not downloads.can_access(user, clearance_request):
+        return None, Response({'error': 'You do not have access to this request.'}, status=status.HTTP_403_FORBIDDEN)
+    return clearance_request, None
+
+
+def comment_recipient_id(user, clearance_request):
+    # Students write to whoever handles the request, staff and admins write to the student
+    if user.id != clearance_request.student_id:
+        return clearance_request.student_id
+    report = getattr(clearance_request, 'report', None)
+    return clearance_request.assigned_staff_id or (report.staff_id if report else None)
+
+
+# A request's comment thread, oldest first with ?cursor= / ?page_size= keyset paging
+class CommentListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, request_id):
+        clearance_request, error = comment_thread_request(request.user, request_id)
+        if error:
+            return error
+
+        try:
+            comments = (
+                Comment.objects.filter(request_id=clearance_request.id)
+                .select_related('sender', 'recipient').order_by('timestamp', 'id')
+            )
+            page, next_cursor = paginate_comments(request, comments)
+            serializer = CommentSerializer(page, many=True)
+            return Response({'results': serializer.data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'error': f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def post(self, request, request_id):
+        clearance_request, error = comment_thread_request(request.user, request_id)
+        if error:
+            return error
+
+        recipient_id = comment_recipient_id(request.user, clearance_request)
+        if recipient_id is None:
+            return Response({'error': 'No staff member is handling this request yet.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = CommentSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic():
+                comment = serializer.save(request=clearance_request, sender_id=request.user.id, recipient_id=recipient_id)
+                # Comment counts are part of the request's dashboard entry
+                ClearanceRequest.objects.filter(id=clearance_request.id).update(updated_at=timezone.now())
+            events.publish_comment(comment)
+            comment = Comment.objects.select_related('sender', 'recipient').get(id=comment.id)
+            return Response(CommentSerializer(comment).data, status=status.HTTP_201_CREATED)
+        except Exception as e:
+            return Response({'error': f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# Marks the current user's comments on a request as read, all of them or the given `ids`
+class CommentMarkReadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, request_id):
+        clearance_request, error = comment_thread_request(request.user, request_id)
+        if error:
+            return error
+
+        ids = request.data.get('ids')
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            return Response({'error': 'ids must be a list of comment ids.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # One UPDATE through comment_recipient_read_idx
+            unread = Comment.objects.filter(recipient_id=request.user.id, is_read=False, request_id=clearance_request.id)
+            if ids is not None:
+                unread = unread.filter(id__in=ids)
+            updated = unread.update(is_read=True)
+            if updated:
+                ClearanceRequest.objects.filter(id=clearance_request.id).update(updated_at=timezone.now())
+            return Response({'marked_read': updated}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({'error': f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# Unread comments addressed to the current user, counted from comment_recipient_read_idx
+class UnreadCommentCountView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            unread = Comment.objects.filter(recipient_id=request.user.id, is_read=False).count()
+            return Response({'unread': unread}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({'error': f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+########################################### EVENT STREAM ############################################
+
+def stream_user(request):
+    """ User for an event stream: the Authorization header, or ?token= since EventSource can't send headers. """
+    authentication = ClaimsJWTAuthentication()
+    try:
+        result = authentication.authenticate(request)
+        if result is not None:
+            return result[0]
+        raw_token = request.GET.get('token')
+        if not raw_token:
+            return None
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+# Server-sent events with compact deltas (see clearance.events) for the student's requests, the
+# staff member's assigned requests and their clearance type queue. Needs an ASGI server, under WSGI
+# every open stream would hold a worker thread for as long as it stays open, so it answers 501 there.
+async def event_stream(request):
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Event streams need an ASGI server, poll the list endpoints instead.'},
+            status=status.HTTP_501_NOT_IMPLEMENTED,
+        )
+
+    user = await sync_to_async(stream_user)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication required.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    channels = await sync_to_async(events.user_channels)(user)
+    subscription = events.broker.subscribe(channels)
+    keepalive = getattr(settings, 'EVENT_STREAM_KEEPALIVE', 15)
+
+    async def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            # Sent on every (re)connect, clients refetch once to cover what they missed while away
+            yield f'data: {events.RESYNC}\n\n'
+            while True:
+                try:
+                    message = await subscription.get(timeout=keepalive)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'data: {message}\n\n'
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx would otherwise buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+######################################## DOCUMENT DOWNLOADS #########################################
+
+# Request documents, report attachments and preview thumbnails, for the student, the staff handling the request and
+# department admins. Works with a bearer token or with the signed link from the serializers.
+class DocumentDownloadView(APIView):
+    permission_classes = []
+
+    def get(self, request, request_id, kind):
+        try:
+            clearance_request = ClearanceRequest.objects.select_related('student', 'report', 'preview').get(id=request_id)
+        except ClearanceRequest.DoesNotExist:
+            return Response({'error': 'Request not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            if request.user.is_authenticated:
+                allowed = downloads.can_access(request.user, clearance_request)
+            else:
+                link_user_id = downloads.read_link_token(request.query_params.get('token', ''), clearance_request.id, kind)
+                if link_user_id is None:
+                    return Response({'error': 'Authentication required.'}, status=status.HTTP_401_UNAUTHORIZED)
+                # Lists hand links to users who can see a request but not its documents, e.g. the scope=all queue
+                link_user = User.objects.filter(id=link_user_id, is_active=True).only('id', 'role', 'department_key').first()
+                allowed = link_user is not None and downloads.can_access(link_user, clearance_request)
+            if not allowed:
+                return Response({'error': 'You do not have access to this document.'}, status=status.HTTP_403_FORBIDDEN)
+
+            if kind == 'request':
+                field_file = clearance_request.file
+            else:
+                related = getattr(clearance_request, kind, None)
+                field_file = (related.document if kind == 'report' else related.thumbnail) if related else None
+            if not field_file:
+                return Response({'error': 'No document attached.'}, status=status.HTTP_404_NOT_FOUND)
+
+            return downloads.serve_file(request, field_file)
+
+        except FileNotFoundError:
+            return Response({'error': 'Document file is missing.'}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({'error': f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 ########################################### ADMIN VIEWS #############################################
\ No newline at end of file
@@ -61,7 +61,7 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
     ),
 }
 
@@ -70,7 +70,20 @@ SIMPLE_JWT = {
     # 'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'AUTH_TOKEN_CLASSES': ('accounts.tokens.ClearanceAccessToken',),
+    'TOKEN_USER_CLASS': 'accounts.authentication.ClaimsUser',
+}
+
+# Seconds a user's active flag is cached by the stateless JWT authentication,
+# i.e. the longest a deactivated user keeps access in other worker processes
+JWT_USER_STATE_CACHE_TTL = 60
+
+# Where revoked refresh tokens are recorded, see accounts.blacklist:
+# DatabaseBlacklist (simplejwt's tables, prune with prune_token_blacklist),
+# CacheBlacklist ({'alias': 'default'}) or RedisBlacklist ({'url': 'redis://...'})
+TOKEN_BLACKLIST = {
+    'BACKEND': 'accounts.blacklist.DatabaseBlacklist',
+    'OPTIONS': {},
 }
 
 
@@ -88,6 +101,24 @@ ROOT_URLCONF = 'project.urls'
 # Where custom roles are defined
 ROLEPERMISSIONS_MODULE = 'accounts.roles'
 
+# Serve staff stats from the materialized clearance.RequestCounter table instead of COUNT queries.
+# Run `python manage.py rebuild_request_counters` once after enabling it.
+CLEARANCE_STATS_COUNTERS = False
+
+# Share clearance type registry invalidations between worker processes through the Django cache.
+# Only useful with a cache backend shared by all workers (e.g. Redis or Memcached).
+CLEARANCE_TYPE_REGISTRY_SHARED = False
+
+# Routing rules (department_scoped, priority, staff_role) live on ClearanceType. The columns default to
+# university wide and low priority, so on an existing database run
+# `python manage.py backfill_clearance_routing` once after migrating to restore the project and lab rules.
+
+# How a submitted request is assigned to one eligible staff member: 'least_loaded' or 'round_robin'
+CLEARANCE_ASSIGNMENT_STRATEGY = 'least_loaded'
+
+# Bulk cohort activation: validity of the one-time tokens
+ACTIVATION_TOKEN_LIFETIME = timedelta(days=14)
+
 
 TEMPLATES = [
     {
@@ -168,6 +199,40 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'frontend/dist/assets'),
 ]
 
+# Largest clearance document accepted, checked while the upload streams in
+DOCUMENT_UPLOAD_MAX_SIZE = 200 * 1024 * 1024
+
+# Resumable uploads: largest chunk per PUT, and how long an unfinished upload is kept
+UPLOAD_CHUNK_MAX_SIZE = 16 * 1024 * 1024
+UPLOAD_SESSION_LIFETIME = timedelta(days=1)
+
+# In-process background tasks (project.tasks): worker threads, or run inline after commit when eager
+BACKGROUND_TASKS_WORKERS = 2
+BACKGROUND_TASKS_EAGER = False
+
+# Serve the read endpoints (my-requests, student-stats, student-history, assigned-requests, stats,
+# user/me) from the async views, worth it when running under ASGI (project.asgi)
+ASYNC_READ_VIEWS = False
+
+# Fan-out of request and comment events to the event streams, see clearance.events:
+# LocalBackend (one process) or RedisBackend ({'url': 'redis://...'}) for several workers
+EVENT_STREAM = {
+    'BACKEND': 'clearance.events.LocalBackend',
+    'OPTIONS': {},
+}
+# Seconds between keepalive comments on an idle event stream
+EVENT_STREAM_KEEPALIVE = 15
+
+# Document downloads: None streams from Django, 'X-Sendfile' (Apache/lighttpd) or 'X-Accel-Redirect'
+# (nginx, internal location at DOCUMENT_ACCEL_REDIRECT_PREFIX aliased to MEDIA_ROOT) hand off to the server
+DOCUMENT_SENDFILE_HEADER = None
+DOCUMENT_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+# Seconds a signed document link from the API stays valid
+DOCUMENT_LINK_MAX_AGE = 3600
+
+# Seconds clients may cache resized avatars (accounts.avatars), their file names never change
+AVATAR_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
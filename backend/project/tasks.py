@@ -0,0 +1,51 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+'''
+Minimal in-process background runner for work that shouldn't hold up a response,
+e.g. document previews and avatar variants.
+
+Tasks run on a small thread pool once the current transaction commits, so they see
+the rows the request created. Set BACKGROUND_TASKS_EAGER to run them inline instead
+(management commands, debugging). Tasks must be idempotent: a worker restart drops
+whatever was still queued, and the backfill commands pick it up again.
+'''
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BACKGROUND_TASKS_WORKERS', 2),
+                    thread_name_prefix='background-task',
+                )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', getattr(func, '__name__', func))
+    finally:
+        # Worker threads keep their own DB connections, don't let them go stale
+        close_old_connections()
+
+
+def run(func, *args, **kwargs):
+    """ Run func(*args, **kwargs) in the background after the current transaction commits. """
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        transaction.on_commit(lambda: func(*args, **kwargs))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_run, func, args, kwargs))
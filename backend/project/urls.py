@@ -15,16 +15,24 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
+from django.views.static import serve
+
+from accounts.avatars import VARIANT_PREFIX, serve_variant
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')),
     path('clearance/', include('clearance.urls')),
+    # Resized avatars with long-lived cache headers, a web server in front may serve MEDIA_ROOT itself instead
+    re_path(rf'^{settings.MEDIA_URL.strip("/")}/(?P<path>{VARIANT_PREFIX}.*)$', serve_variant),
 ]
 
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Only public media in development, documents go through clearance's access-controlled download view
+    urlpatterns += [
+        re_path(rf'^{settings.MEDIA_URL.strip("/")}/(?P<path>avatars/.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+    ]
\ No newline at end of file
@@ -1,5 +1,6 @@
-INSERT INTO accounts_clearancetype(clearance_type) VALUES
-    ('project'), ('lab'), ('library');
+-- Routing rules: project and lab are handled by staff of the student's department, library university wide
+INSERT INTO accounts_clearancetype(clearance_type, department_scoped, priority, staff_role) VALUES
+    ('project', 1, 'high', 'staff'), ('lab', 1, 'medium', 'staff'), ('library', 0, 'medium', 'staff');
 
 -- 20 valid students
 INSERT INTO accounts_validstudent (